@@ -1,11 +1,169 @@
 #! /usr/bin/env python
 
-class TextRectException:
+class TextRectException(Exception):
     def __init__(self, message = None):
         self.message = message
     def __str__(self):
         return self.message
 
+class TextLayout:
+    """The word-wrapped lines of a text string, measured but not yet
+    rendered. A layout can be rendered any number of times, split into
+    pages or streamed line by line.
+
+    lines - the wrapped lines, in order
+    widths - the width in pixels of each line
+    heights - the height in pixels of each line
+    width - the width the text was wrapped to
+    """
+
+    def __init__(self, lines, widths, heights, width):
+        self.lines = lines
+        self.widths = widths
+        self.heights = heights
+        self.width = width
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def height(self):
+        """Height in pixels of all lines stacked on top of each other."""
+        return sum(self.heights)
+
+    def fits(self, height):
+        """True if all lines fit into a rect of the given height."""
+        # a line only fits if it ends above the bottom edge
+        return self.height < height or not self.lines
+
+    def pages(self, height):
+        """Splits the layout into pages that fit into a rect of the given
+        height. Returns a list of TextLayout objects."""
+        pages = []
+        start = 0
+        accumulated_height = 0
+        for index, line_height in enumerate(self.heights):
+            if accumulated_height + line_height >= height:
+                if index == start:
+                    raise TextRectException("The rect is too small to fit a single line of text.")
+                pages.append(self._slice(start, index))
+                start = index
+                accumulated_height = 0
+            accumulated_height += line_height
+        pages.append(self._slice(start, len(self.lines)))
+        return pages
+
+    def _slice(self, start, end):
+        return TextLayout(self.lines[start:end], self.widths[start:end], self.heights[start:end], self.width)
+
+
+def layout_text(string, font, width):
+    """Word-wraps the passed text string to the given width and returns
+    a TextLayout. Every distinct word is measured once, line widths are
+    accumulated from the word widths instead of re-measuring each line.
+
+    Takes the following arguments:
+
+    string - the text you wish to lay out. \\n begins a new line.
+    font - a Font object
+    width - the width in pixels the lines have to fit in.
+
+    Failure - raises a TextRectException if a word is too long to fit.
+    """
+
+    word_widths = {}
+    def measure(text):
+        size = word_widths.get(text)
+        if size is None:
+            size = word_widths[text] = font.size(text)[0]
+        return size
+
+    space = measure(" ")
+    lines = []
+    widths = []
+
+    for requested_line in string.splitlines():
+        line_width = font.size(requested_line)[0]
+        if line_width <= width:
+            lines.append(requested_line)
+            widths.append(line_width)
+            continue
+        words = requested_line.split(' ')
+        word_sizes = [measure(word) for word in words]
+        # if any of our words are too long to fit, return.
+        for word, size in zip(words, word_sizes):
+            if size >= width:
+                raise TextRectException("The word " + word + " is too long to fit in the rect passed.")
+        # Build the lines while the words fit (each word is followed by a space).
+        accumulated_line = []
+        accumulated_width = 0
+        for word, size in zip(words, word_sizes):
+            estimate = accumulated_width + size + space
+            # summed word widths can be off by a pixel per word (kerning), so
+            # lines close to the edge are measured exactly
+            tolerance = len(accumulated_line) + 1
+            if abs(estimate - width) <= tolerance:
+                estimate = font.size(" ".join(accumulated_line + [word]) + " ")[0]
+            if estimate < width:
+                accumulated_line.append(word)
+                accumulated_width += size + space
+            else:
+                lines.append(" ".join(accumulated_line) + " " if accumulated_line else "")
+                widths.append(accumulated_width)
+                accumulated_line = [word]
+                accumulated_width = size + space
+        lines.append(" ".join(accumulated_line) + " " if accumulated_line else "")
+        widths.append(accumulated_width)
+
+    # the height of a rendered line depends on its glyphs, measure each line once
+    heights = [font.size(line)[1] for line in lines]
+    return TextLayout(lines, widths, heights, width)
+
+
+def render_layout(layout, font, rect, text_color, background_color, justification=0, surface=None):
+    """Rasterizes a TextLayout onto a surface the size of rect (a new one
+    unless surface is passed). Takes the same arguments as
+    render_textrect.
+
+    Failure - raises a TextRectException if the lines are too tall to fit.
+    """
+
+    import pygame
+
+    if justification not in (0, 1, 2):
+        raise TextRectException("Invalid justification argument: " + str(justification))
+    if not layout.fits(rect.height):
+        raise TextRectException("Once word-wrapped, the text string was too tall to fit in the rect.")
+
+    if surface is None:
+        surface = pygame.Surface(rect.size)
+    surface.fill(background_color)
+
+    accumulated_height = 0
+    for line, line_height in zip(layout.lines, layout.heights):
+        if line != "":
+            tempsurface = font.render(line, 1, text_color)
+            if justification == 0:
+                surface.blit(tempsurface, (0, accumulated_height))
+            elif justification == 1:
+                surface.blit(tempsurface, ((rect.width - tempsurface.get_width()) / 2, accumulated_height))
+            else:
+                surface.blit(tempsurface, (rect.width - tempsurface.get_width(), accumulated_height))
+        accumulated_height += line_height
+
+    return surface
+
+
+def render_pages(string, font, rect, text_color, background_color, justification=0):
+    """Generator that word-wraps the passed text string once and yields
+    one surface per rect-sized page, so long texts can be shown (or
+    streamed) across several rects instead of raising. Takes the same
+    arguments as render_textrect."""
+
+    layout = layout_text(string, font, rect.width)
+    for page in layout.pages(rect.height):
+        yield render_layout(page, font, rect, text_color, background_color, justification)
+
 def render_textrect(string, font, rect, text_color, background_color, justification=0):
     """Returns a surface containing the passed text string, reformatted
     to fit within the given rect, word-wrapping as necessary. The text
@@ -29,58 +187,7 @@ def render_textrect(string, font, rect, text_color, background_color, justificat
     Failure - raises a TextRectException if the text won't fit onto the surface.
     """
 
-    import pygame
-    
-    final_lines = []
-
-    requested_lines = string.splitlines()
-
-    # Create a series of lines that will fit on the provided
-    # rectangle.
-
-    for requested_line in requested_lines:
-        if font.size(requested_line)[0] > rect.width:
-            words = requested_line.split(' ')
-            # if any of our words are too long to fit, return.
-            for word in words:
-                if font.size(word)[0] >= rect.width:
-                    raise Exception("The word " + word + " is too long to fit in the rect passed.")
-            # Start a new line
-            accumulated_line = ""
-            for word in words:
-                test_line = accumulated_line + word + " "
-                # Build the line while the words fit.    
-                if font.size(test_line)[0] < rect.width:
-                    accumulated_line = test_line
-                else:
-                    final_lines.append(accumulated_line)
-                    accumulated_line = word + " "
-            final_lines.append(accumulated_line)
-        else:
-            final_lines.append(requested_line)
-
-    # Let's try to write the text out on the surface.
-
-    surface = pygame.Surface(rect.size)
-    surface.fill(background_color)
-
-    accumulated_height = 0
-    for line in final_lines:
-        if accumulated_height + font.size(line)[1] >= rect.height:
-            raise Exception("Once word-wrapped, the text string was too tall to fit in the rect.")
-        if line != "":
-            tempsurface = font.render(line, 1, text_color)
-            if justification == 0:
-                surface.blit(tempsurface, (0, accumulated_height))
-            elif justification == 1:
-                surface.blit(tempsurface, ((rect.width - tempsurface.get_width()) / 2, accumulated_height))
-            elif justification == 2:
-                surface.blit(tempsurface, (rect.width - tempsurface.get_width(), accumulated_height))
-            else:
-                raise Exception("Invalid justification argument: " + str(justification))
-        accumulated_height += font.size(line)[1]
-
-    return surface
+    return render_layout(layout_text(string, font, rect.width), font, rect, text_color, background_color, justification)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,142 @@
+# Sprite atlas and prebuilt asset bundle
+# The build step decodes and pre-scales the sprites once and packs them into a single atlas sheet.
+# Images that do not belong into the atlas (e.g. the opaque background) get a sheet of their own.
+# The sheets are written as raw pixels into one bundle file, which is memory-mapped at startup and
+# registered in the resource registry, so every sprite becomes a subsurface of its sheet.
+#   python atlas.py		(writes main.BUNDLE_FILE)
+import json
+import mmap
+import os
+import struct
+import pygame
+import resources
+
+MAGIC = b"MURIBNDL"
+VERSION = 1
+_HEADER = struct.Struct("<8sII")	# magic, version, length of the JSON index
+ATLAS_WIDTH = 1024
+PADDING = 1		# transparent pixels between sprites
+
+_bundles = list()	# memory maps the loaded sheets still point into
+
+# Positions of rectangles (width, height) on shelves of a sheet `width` pixels wide
+# returns the positions (in input order) and the height of the sheet
+def pack(sizes:list, width:int=ATLAS_WIDTH, padding:int=PADDING) -> tuple[list, int]:
+	positions = [None]*len(sizes)
+	x = y = shelf_height = 0
+	# tallest first, so each shelf wastes as little height as possible
+	for index in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+		w, h = sizes[index]
+		if w > width:
+			raise ValueError(f"Sprite of width {w} does not fit into an atlas of width {width}")
+		if x+w > width:
+			x, y, shelf_height = 0, y+shelf_height+padding, 0
+		positions[index] = (x, y)
+		x += w+padding
+		shelf_height = max(shelf_height, h)
+	return positions, y+shelf_height
+
+# Source file fingerprint, a bundle is only used while all of its sources are unchanged
+def _stamp(path:str) -> list:
+	stat = os.stat(path)
+	return [stat.st_size, stat.st_mtime_ns]
+
+# Pack the images with alpha into one atlas, every opaque image into a sheet of its own, and write
+# them into a bundle file
+def build(keys:list, path:str, width:int=ATLAS_WIDTH) -> dict:
+	keys = list(dict.fromkeys(keys))
+	sprites = [key for key in keys if key.alpha]
+	surfaces = [resources._decode(key) for key in sprites]
+	positions, height = pack([surface.get_size() for surface in surfaces], width)
+	atlas = pygame.Surface((width, max(height, 1)), pygame.SRCALPHA)
+	atlas.fill((0, 0, 0, 0))
+	atlas.blits([(surface, position) for surface, position in zip(surfaces, positions)], doreturn=False)
+	sheets = [(atlas, "RGBA", [(key, (*position, *surface.get_size())) for key, surface, position in zip(sprites, surfaces, positions)])]
+	for key in keys:
+		if not key.alpha:
+			surface = resources._decode(key)
+			sheets.append((surface, "RGB", [(key, (0, 0, *surface.get_size()))]))
+
+	index = {"sheets": [], "sources": {key.path: _stamp(key.path) for key in keys}}
+	data = list()
+	offset = 0
+	for surface, fmt, regions in sheets:
+		pixels = pygame.image.tobytes(surface, fmt)
+		index["sheets"].append({
+			"format": fmt,
+			"size": surface.get_size(),
+			"offset": offset,
+			"sprites": [{"path": key.path, "size": key.size, "alpha": key.alpha, "rect": rect} for key, rect in regions],
+		})
+		data.append(pixels)
+		offset += len(pixels)
+	encoded = json.dumps(index).encode()
+	# written next to the bundle and swapped in at once, an interrupted build leaves the old bundle
+	temporary = path+".tmp"
+	with open(temporary, "wb") as file:
+		file.write(_HEADER.pack(MAGIC, VERSION, len(encoded)))
+		file.write(encoded)
+		for pixels in data:
+			file.write(pixels)
+	os.replace(temporary, path)
+	return index
+
+# Map a bundle file and register its sprites as subsurfaces of their sheets
+# returns False (and registers nothing) if the bundle is missing, damaged, from another version or stale
+def load(path:str) -> bool:
+	try:
+		with open(path, "rb") as file:
+			data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+	except (OSError, ValueError):
+		return False	# missing, unreadable or empty
+	sheets = _index(data)
+	if sheets is None:
+		data.close()
+		return False
+	view = memoryview(data)
+	for sheet, offset in sheets:
+		width, height = sheet["size"]
+		surface = pygame.image.frombuffer(view[offset:offset+width*height*len(sheet["format"])], (width, height), sheet["format"])
+		regions = {resources.handle(sprite["path"], sprite["size"], sprite["alpha"]): sprite["rect"] for sprite in sheet["sprites"]}
+		resources.add_sheet(surface, regions, sheet["format"] == "RGBA")
+	# the unconverted sheets still read from the mapping
+	_bundles.append((data, view))
+	return True
+
+# Sheets of a mapped bundle with the file offsets of their pixels, after checking that the header,
+# the index and every sheet fit into the file (None if the bundle can not be used)
+def _index(data) -> list:
+	if len(data) < _HEADER.size:
+		return None
+	magic, version, length = _HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION:
+		return None
+	start = _HEADER.size+length
+	if start > len(data):
+		return None
+	try:
+		index = json.loads(data[_HEADER.size:start])
+		stale = any(_stamp(source) != stamp for source, stamp in index["sources"].items())
+		sheets = list()
+		for sheet in index["sheets"]:
+			width, height = sheet["size"]
+			offset = start+sheet["offset"]
+			if sheet["format"] not in ("RGB", "RGBA") or width <= 0 or height <= 0 or sheet["offset"] < 0:
+				return None
+			if offset+width*height*len(sheet["format"]) > len(data):
+				return None
+			for sprite in sheet["sprites"]:
+				x, y, w, h = sprite["rect"]
+				if x < 0 or y < 0 or x+w > width or y+h > height:
+					return None
+			sheets.append((sheet, offset))
+	except OSError:
+		return None	# a source is gone
+	except (ValueError, KeyError, TypeError):
+		return None	# damaged index (json.JSONDecodeError is a ValueError)
+	return None if stale else sheets
+
+if __name__=="__main__":
+	import main
+	index = build(main.BUNDLE_IMAGES, main.BUNDLE_FILE)
+	print(f"{main.BUNDLE_FILE}: {sum(len(sheet['sprites']) for sheet in index['sheets'])} images in {len(index['sheets'])} sheets")
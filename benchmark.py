@@ -0,0 +1,314 @@
+# Benchmarks for the hot paths of the game (update, collision, rendering, text, asset loading)
+# Runs on SDL's dummy drivers and writes the results as JSON, e.g.
+#   python benchmark.py --output bench.json
+#   python benchmark.py --only move collide --sizes 100 1000
+#   python benchmark.py --only replay --replay session.rpl
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import atlas
+import entitystore
+import gpu
+import main
+import replay
+import resources
+import Textrect
+
+SIZES = (10, 100, 1000, 10000)
+WAVES_FILE = "./assets/waves.json"
+PAIRS_DENSITY = 100		# entities on the field in the pairs benchmarks
+NAIVE_LIMIT = 2000		# largest count the O(n^2) pair benchmark runs with
+FRAMES = 200
+
+SHORT_TEXT = '''
+Controls:
+- Use WASD controls to move
+- Press [F] to toggle Flightmode\n
+Gameplay:
+Survive for as long as you can!
+You can only fly for a limited time\n
+* Press the W key to start! *'''
+LONG_TEXT = " ".join(["murimuri"*(i%3+1) for i in range(2000)])
+
+# Percentile of an already sorted list
+def percentile(values:list, p:float) -> float:
+	index = min(len(values)-1, max(0, round(p/100*(len(values)-1))))
+	return values[index]
+
+# Call frame() `frames` times and collect per-frame timings
+def measure(frame, frames:int=FRAMES, warmup:int=5) -> dict:
+	for _ in range(warmup):
+		frame()
+	timings = list()
+	for _ in range(frames):
+		start = time.perf_counter_ns()
+		frame()
+		timings.append(time.perf_counter_ns()-start)
+	total = sum(timings)
+	timings.sort()
+	return {
+		"frames": frames,
+		"ticks_per_second": frames/(total/1e9) if total else float("inf"),
+		"mean_ms": total/frames/1e6,
+		"p50_ms": percentile(timings, 50)/1e6,
+		"p95_ms": percentile(timings, 95)/1e6,
+		"p99_ms": percentile(timings, 99)/1e6,
+		"max_ms": timings[-1]/1e6,
+	}
+
+# A game world with `count` entities (balls, aliens and cacti in turn) and a deterministic RNG
+def make_game(count:int, seed:int=0, store:bool=False) -> main.Game:
+	game = main.Game(clock=main.TickClock(), rng=random.Random(seed), store=store, capacity=None)
+	# despawn the starting ball (from the game's own store, built like in a real game)
+	for entity in game.entities:
+		entity.alive = False
+	game.despawn()
+	kinds = ("ball", "alien", "cactus")
+	for i in range(count):
+		game.spawn({kinds[i%3]:1})
+	return game
+
+def bench_refresh_hitbox(count:int, frames:int) -> dict:
+	entities = make_game(count).entities
+	def frame():
+		for entity in entities:
+			entity.refreshHitbox(offset=entity._hitboxOffset)
+	return measure(frame, frames)
+
+def bench_move(count:int, frames:int) -> dict:
+	game = make_game(count)
+	def frame():
+		for entity in game.entities:
+			entity.move()
+		game.player.move()
+	return measure(frame, frames)
+
+def bench_move_store(count:int, frames:int) -> dict:
+	game = make_game(count, store=True)
+	def frame():
+		game.store.step()
+		game.player.move()
+	return measure(frame, frames)
+
+# A game whose player can always be hit, but never takes damage (every tick runs the full check)
+def make_collide_game(count:int, store:bool=False) -> main.Game:
+	game = make_game(count, store=store)
+	game.player.last_damaged = -10**9
+	game.player.hit = lambda: None
+	return game
+
+def bench_collide(count:int, frames:int) -> dict:
+	return measure(make_collide_game(count).collide, frames)
+
+def bench_collide_store(count:int, frames:int) -> dict:
+	return measure(make_collide_game(count, store=True).collide, frames)
+
+# A game whose `count` entities are scattered over an area growing with the count, at the density of
+# PAIRS_DENSITY entities on the field (entities of one lane would all overlap each other)
+def make_scattered_game(count:int, seed:int=0) -> main.Game:
+	game = make_game(count, seed)
+	rng = random.Random(seed)
+	spread = max(1.0, (count/PAIRS_DENSITY)**0.5)
+	for entity in game.entities:
+		offset = entity._hitboxOffset
+		entity.setPos(main.minPos[0]+rng.random()*main.FIELDSIZE[0]*spread, main.minPos[1]+rng.random()*main.FIELDSIZE[1]*spread)
+		entity.refreshHitbox(offset=offset)
+	return game
+
+# Overlapping entity pairs with the spatial hash (rebuilt every frame, like the debug outlines do)
+def bench_pairs(count:int, frames:int) -> dict:
+	return measure(make_scattered_game(count).entity_collisions, frames)
+
+# Overlapping entity pairs by testing every pair, the O(n^2) baseline of bench_pairs
+def bench_pairs_naive(count:int, frames:int) -> dict:
+	entities = make_scattered_game(count).entities
+	def frame():
+		return [(a, b) for index, a in enumerate(entities) for b in entities[index+1:] if a.hitbox.colliderect(b.hitbox)]
+	return measure(frame, frames)
+
+def bench_update(count:int, frames:int) -> dict:
+	game = make_game(count)
+	def frame():
+		game.update(main.NO_INPUT)
+		game.clock.tick(main.TPS)
+	return measure(frame, frames)
+
+def bench_render(count:int, frames:int) -> dict:
+	game = make_game(count)
+	screen = pygame.display.get_surface()
+	background_img = resources.image("./assets/background.jpg", alpha=False)
+	def frame():
+		main.draw(screen, game, background_img)
+		pygame.display.update()
+	return measure(frame, frames)
+
+def bench_render_dirty(count:int, frames:int) -> dict:
+	game = make_game(count)
+	renderer = main.DirtyRenderer(pygame.display.get_surface(), resources.image("./assets/background.jpg", alpha=False))
+	def frame():
+		renderer.draw(game)
+		renderer.present()
+	return measure(frame, frames)
+
+def bench_render_scaled(count:int, frames:int) -> dict:
+	game = make_game(count)
+	renderer = main.ScaledRenderer(pygame.display.get_surface(), resources.image("./assets/background.jpg", alpha=False), (main.WIDTH//2, main.HEIGHT//2))
+	def frame():
+		renderer.draw(game)
+		renderer.present()
+	return measure(frame, frames)
+
+_displays = list()	# one texture display for every texture benchmark (SDL windows are not freed right away)
+
+# SDL's renderer (the GPU where available, else SDL's software renderer)
+def bench_render_texture(count:int, frames:int) -> dict:
+	if not _displays:
+		_displays.append(gpu.TextureDisplay((main.WIDTH, main.HEIGHT), "benchmark"))
+	game = make_game(count)
+	renderer = main.TextureRenderer(_displays[0], resources.image("./assets/background.jpg", alpha=False))
+	def frame():
+		renderer.draw(game)
+		renderer.present()
+	return measure(frame, frames)
+
+def bench_textrect(text:str, size:tuple, frames:int) -> dict:
+	font = pygame.font.Font(None, 45)
+	rect = pygame.Rect((0, 0, *size))
+	return measure(lambda: Textrect.render_textrect(text, font, rect, (0,0,0), (255,255,255), 1), frames)
+
+def bench_textlayout(text:str, width:int, frames:int) -> dict:
+	font = pygame.font.Font(None, 45)
+	return measure(lambda: Textrect.layout_text(text, font, width), frames)
+
+# Cold start of the sprites: decoding every image file or mapping the prebuilt bundle
+def bench_load(bundle:bool, frames:int) -> dict:
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "sprites.bundle")
+		atlas.build(main.BUNDLE_IMAGES, path)
+		def frame():
+			resources.clear()
+			if bundle:
+				atlas.load(path)
+			for key in main.BUNDLE_IMAGES:
+				resources.image(key)
+		result = measure(frame, frames)
+		resources.clear()
+	return result
+
+# Every tick of a recorded round (real input, spawns and collisions)
+def bench_replay(path:str) -> dict:
+	recording = replay.Replay.load(path)
+	switches = main.simulation_switches()
+	main.apply_switches(recording.switches)
+	try:
+		game = main.Game(clock=main.TickClock(recording.tps), rng=random.Random(recording.seed), tps=recording.tps, schedule=main.load_schedule(recording.waves))
+		def frame():
+			game.update(recording.inputs(game.ticks))
+			game.clock.tick(recording.tps)
+		result = measure(frame, len(recording), warmup=0)
+	finally:
+		main.apply_switches(switches)
+	result["matches"] = replay.digest(game.state()) == recording.state if recording.state else None
+	if recording.state and entitystore.numpy is not None:
+		result["matches_store"] = replay.digest(main.replay_headless(recording, store=True).state()) == recording.state
+	return result
+
+# Final state digests of seeded rounds moved by the objects and by the entity store (with held random
+# keys and the waves file), both paths must end in the same state
+def check_store(ticks:int, seeds=range(5)) -> dict:
+	results = dict()
+	for seed in seeds:
+		keys = random.Random(seed)
+		masks = [keys.randrange(1 << 5) for _ in range(ticks//30+1)]
+		inputs = lambda tick: replay.STATES[masks[tick//30]]
+		digests = [replay.digest(main.simulate(ticks, seed=seed, inputs=inputs, store=store, schedule=main.load_schedule(WAVES_FILE)).state()) for store in (False, True)]
+		results[seed] = digests[0] == digests[1]
+	return {"ticks": ticks, "seeds": results, "matches": all(results.values())}
+
+# Current git commit (if available) so results can be compared across commits
+def git_commit() -> str:
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+BENCHMARKS = {
+	"refresh_hitbox": bench_refresh_hitbox,
+	"move": bench_move,
+	"collide": bench_collide,
+	"move_store": bench_move_store,
+	"collide_store": bench_collide_store,
+	"pairs": bench_pairs,
+	"pairs_naive": bench_pairs_naive,
+	"update": bench_update,
+	"render": bench_render,
+	"render_dirty": bench_render_dirty,
+	"render_scaled": bench_render_scaled,
+	"render_texture": bench_render_texture,
+}
+
+def run(sizes=SIZES, frames:int=FRAMES, only=None, replays=()) -> dict:
+	main.headless()
+	pygame.display.set_mode((main.WIDTH, main.HEIGHT))
+	results = dict()
+	for name, bench in BENCHMARKS.items():
+		if only and name not in only:
+			continue
+		if name.endswith("_store") and entitystore.numpy is None:
+			continue
+		if name == "render_texture" and gpu.video is None:
+			continue
+		for count in sizes:
+			if name == "pairs_naive" and count > NAIVE_LIMIT:
+				continue
+			results[f"{name}[{count}]"] = bench(count, frames)
+			print(f"{name}[{count}]: {results[f'{name}[{count}]']['ticks_per_second']:.1f} ticks/s", flush=True)
+	if not only or "textrect" in only:
+		results["textrect[short]"] = bench_textrect(SHORT_TEXT, (500, 400), frames)
+		results["textrect[long]"] = bench_textrect(LONG_TEXT, (1500, 20000), max(1, frames//10))
+		results["textlayout[long]"] = bench_textlayout(LONG_TEXT, 1500, frames)
+		for name in ("textrect[short]", "textrect[long]", "textlayout[long]"):
+			print(f"{name}: {results[name]['ticks_per_second']:.1f} ticks/s", flush=True)
+	if not only or "load" in only:
+		results["load[files]"] = bench_load(False, max(1, frames//10))
+		results["load[bundle]"] = bench_load(True, max(1, frames//10))
+		for name in ("load[files]", "load[bundle]"):
+			print(f"{name}: {results[name]['ticks_per_second']:.1f} ticks/s", flush=True)
+	if (not only or "store_check" in only) and entitystore.numpy is not None:
+		results["store_check"] = check_store(frames*30)
+		print(f"store_check: object and store digests match: {results['store_check']['matches']}", flush=True)
+	if not only or "replay" in only:
+		for path in replays:
+			name = f"replay[{os.path.basename(path)}]"
+			results[name] = bench_replay(path)
+			print(f"{name}: {results[name]['ticks_per_second']:.1f} ticks/s, matches recording: {results[name]['matches']} (store: {results[name].get('matches_store')})", flush=True)
+	return {
+		"commit": git_commit(),
+		"python": platform.python_version(),
+		"pygame": pygame.version.ver,
+		"frames": frames,
+		"results": results,
+	}
+
+if __name__=="__main__":
+	parser = argparse.ArgumentParser(description="murimuri benchmarks")
+	parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="entity counts to benchmark")
+	parser.add_argument("--frames", type=int, default=FRAMES, help="measured frames per benchmark")
+	parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS)+["textrect", "load", "store_check", "replay"], help="only run these benchmarks")
+	parser.add_argument("--output", default="bench.json", help="JSON file to write the results to")
+	parser.add_argument("--replay", nargs="+", default=(), metavar="FILE", help="recorded rounds (main.py --record) to replay tick by tick")
+	args = parser.parse_args()
+	report = run(args.sizes, args.frames, args.only, args.replay)
+	with open(args.output, "w") as file:
+		json.dump(report, file, indent=2)
+	print(f"Results written to {args.output}")
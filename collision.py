@@ -0,0 +1,122 @@
+# Collision broadphase: a spatial hash over persistent pygame.Rect hitboxes
+# Items only need a `hitbox` attribute holding a pygame.Rect.
+
+class SpatialHash():
+	def __init__(self, cell_size:int=128):
+		self._cell_size = cell_size
+		self._cells = dict()
+
+	# Range of cells covered by a rect
+	def _cell_range(self, rect) -> tuple[int, int, int, int]:
+		size = self._cell_size
+		return (rect[0]//size, rect[1]//size, (rect[0]+max(rect[2]-1, 0))//size, (rect[1]+max(rect[3]-1, 0))//size)
+
+	def clear(self) -> None:
+		self._cells.clear()
+
+	# Rebuild the hash from scratch (once per tick, O(n))
+	def build(self, items) -> None:
+		cells = self._cells
+		cells.clear()
+		size = self._cell_size
+		for item in items:
+			x, y, w, h = item.hitbox
+			x0, y0 = x//size, y//size
+			x1, y1 = (x+max(w-1, 0))//size, (y+max(h-1, 0))//size
+			for cx in range(x0, x1+1):
+				for cy in range(y0, y1+1):
+					bucket = cells.get((cx, cy))
+					if bucket is None:
+						cells[(cx, cy)] = [item]
+					else:
+						bucket.append(item)
+
+	# All items whose hitbox overlaps rect, each reported once
+	def query(self, rect) -> list:
+		cells = self._cells
+		x0, y0, x1, y1 = self._cell_range(rect)
+		found = list()
+		seen = set()
+		for cx in range(x0, x1+1):
+			for cy in range(y0, y1+1):
+				for item in cells.get((cx, cy), ()):
+					if id(item) not in seen and rect.colliderect(item.hitbox):
+						seen.add(id(item))
+						found.append(item)
+		return found
+
+	# All overlapping pairs of items, each reported once
+	def pairs(self) -> list:
+		size = self._cell_size
+		found = list()
+		for (cx, cy), bucket in self._cells.items():
+			for i in range(len(bucket)):
+				a = bucket[i]
+				rect = a.hitbox
+				for b in bucket[i+1:]:
+					other = b.hitbox
+					if a is b or not rect.colliderect(other):
+						continue
+					# only report the pair in the cell holding the top left corner of the overlap
+					if max(rect[0], other[0])//size == cx and max(rect[1], other[1])//size == cy:
+						found.append((a, b))
+		return found
+
+# Cell size that splits the field into a uniform grid (at least as large as the biggest sprite)
+def cell_size_for(field_size:tuple, sprite_size:int=0, cells:int=4) -> int:
+	return max(min(field_size)//cells, sprite_size, 1)
+
+# Continuous collision (swept AABB): hits and walls between two ticks are found at any speed.
+# Rects are (x, y, width, height) tuples or pygame.Rects, movements are in pixels per tick.
+
+# Times (0-1 of the tick) at which a rect moving by (dx, dy) starts and stops overlapping a resting
+# target, None if they never overlap during the move (a moving target is handled with the relative
+# movement, i.e. dx-target_dx, dy-target_dy)
+def sweep(rect, dx:float, dy:float, target) -> tuple[float, float]:
+	if rect[2] <= 0 or rect[3] <= 0 or target[2] <= 0 or target[3] <= 0:
+		return None
+	enter, leave = 0.0, 1.0
+	for start, size, delta, low, length in ((rect[0], rect[2], dx, target[0], target[2]), (rect[1], rect[3], dy, target[1], target[3])):
+		if delta == 0:
+			if start+size <= low or start >= low+length:
+				return None
+			continue
+		# the leading edge reaches the target, the trailing edge leaves it
+		first, last = (low-start-size)/delta, (low+length-start)/delta
+		if delta < 0:
+			first, last = last, first
+		enter, leave = max(enter, first), min(leave, last)
+	return (enter, leave) if enter < leave else None
+
+# Time of impact (0-1 of the tick) of a rect moving by (dx, dy) on a resting target (0 if they
+# already overlap), None if it misses
+def time_of_impact(rect, dx:float, dy:float, target):
+	hit = sweep(rect, dx, dy, target)
+	return hit[0] if hit else None
+
+# Time (0-1 of the tick) at which a rect moving by (dx, dy) inside bounds reaches their edge,
+# None if it stays inside for the whole move
+def bounds_impact(rect, dx:float, dy:float, bounds):
+	impact = None
+	for start, size, delta, low, length in ((rect[0], rect[2], dx, bounds[0], bounds[2]), (rect[1], rect[3], dy, bounds[1], bounds[3])):
+		if delta > 0 and start+size+delta > low+length:
+			time = max(0.0, (low+length-start-size)/delta)
+		elif delta < 0 and start+delta < low:
+			time = max(0.0, (low-start)/delta)
+		else:
+			continue
+		impact = time if impact is None else min(impact, time)
+	return impact
+
+# Position after moving from position by delta between low and high, bouncing off both ends as often
+# as the move reaches them, and the direction (1 or -1) of the movement afterwards
+def bounce(position:float, delta:float, low:float, high:float) -> tuple[float, int]:
+	direction = 1 if delta >= 0 else -1
+	span = high-low
+	if span <= 0:
+		return low, direction
+	# unfold the bounces into a straight line, every second span runs backwards
+	unfolded = (min(max(position, low), high)-low+delta) % (2*span)
+	if unfolded < span:
+		return low+unfolded, direction
+	return low+2*span-unfolded, -direction
@@ -0,0 +1,237 @@
+# Structure-of-arrays entity store (optional, needs numpy)
+# Positions, velocities, steps and hitboxes of balls and aliens live in numpy arrays and are
+# advanced in one vectorized step per tick. The Entity objects become thin views over their row.
+import pygame
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Entity kinds
+BALL = 0	# bounces off the field walls like a dvd logo
+ALIEN = 1	# scrolls from right to left and respawns in a random lane
+
+# Properties that redirect an entity's position and hitbox to its row in the store
+class EntityView():
+	__slots__ = ()
+
+	_x = property(lambda self: self._store.x[self._slot].item(), lambda self, value: self._store.x.__setitem__(self._slot, value))
+	_y = property(lambda self: self._store.y[self._slot].item(), lambda self, value: self._store.y.__setitem__(self._slot, value))
+	_hitbox = property(lambda self: pygame.Rect(self._store.hitbox[self._slot].tolist()), lambda self, value: None)
+
+	def snapshot(self) -> None:
+		self._store.prev_x[self._slot], self._store.prev_y[self._slot] = self._store.x[self._slot], self._store.y[self._slot]
+
+	def lerp(self, alpha:float) -> tuple:
+		store, slot = self._store, self._slot
+		return (store.prev_x[slot]+(store.x[slot]-store.prev_x[slot])*alpha, store.prev_y[slot]+(store.y[slot]-store.prev_y[slot])*alpha)
+
+	moved = property(lambda self: ((self._store.x[self._slot]-self._store.prev_x[self._slot]).item(), (self._store.y[self._slot]-self._store.prev_y[self._slot]).item()))
+
+	# Bulk movement happens in EntityStore.step
+	def move(self) -> None:
+		pass
+
+	def refreshHitbox(self, offset=5) -> None:
+		self._store.refresh(self._slot, offset)
+
+	stored = True
+
+class EntityStore():
+	# passes: screen crossings after which an alien despawns (None: aliens wrap forever)
+	# continuous: balls bounce exactly where they reach a wall (see collision.bounce)
+	def __init__(self, field:tuple, width:int, rng, capacity:int=64, passes:int=None, continuous:bool=False):
+		if numpy is None:
+			raise RuntimeError("The entity store needs numpy (pip install numpy)")
+		(self._min_x, self._min_y), (self._max_x, self._max_y) = field
+		self._respawn_x = width	# x position aliens respawn at
+		self.rng = rng	# random lanes of respawning aliens (the game's RNG)
+		self._max_passes = passes
+		self._continuous = continuous
+		self.count = 0
+		self.entities = list()
+		self._views = dict()
+		self._allocate(capacity)
+
+	def _allocate(self, capacity:int) -> None:
+		def grow(array, dtype, columns=None):
+			shape = (capacity, columns) if columns else capacity
+			new = numpy.zeros(shape, dtype=dtype)
+			if array is not None:
+				new[:self.count] = array[:self.count]
+			return new
+		get = lambda name: getattr(self, name, None)
+		self.kind = grow(get("kind"), numpy.int8)
+		self.x = grow(get("x"), numpy.float64)
+		self.y = grow(get("y"), numpy.float64)
+		self.prev_x = grow(get("prev_x"), numpy.float64)	# positions at the start of the tick
+		self.prev_y = grow(get("prev_y"), numpy.float64)
+		self.vel_x = grow(get("vel_x"), numpy.float64)
+		self.vel_y = grow(get("vel_y"), numpy.float64)
+		self.step_size = grow(get("step_size"), numpy.float64)
+		self.size = grow(get("size"), numpy.int64, 2)
+		self.offset = grow(get("offset"), numpy.int64)
+		self.spawn_area = grow(get("spawn_area"), numpy.int64)
+		self.passes = grow(get("passes"), numpy.int64)
+		self.hitbox = grow(get("hitbox"), numpy.int64, 4)
+		self.capacity = capacity
+
+	# Make room for at least `capacity` entities (one allocation for a whole group of spawns)
+	def reserve(self, capacity:int) -> None:
+		if capacity > self.capacity:
+			self._allocate(max(capacity, self.capacity*2))
+
+	# View class of an entity class (created once per class)
+	def _view_class(self, cls):
+		view = self._views.get(cls)
+		if view is None:
+			view = self._views[cls] = type(cls.__name__, (EntityView, cls), {"__slots__": ()})
+		return view
+
+	# Move an entity into the store, it becomes a view over its row
+	def add(self, entity, kind:int, offset:int):
+		if entity.stored:
+			return entity
+		if self.count == self.capacity:
+			self._allocate(self.capacity*2)
+		slot = self.count
+		self.kind[slot] = kind
+		self.x[slot], self.y[slot] = entity._x, entity._y
+		self.prev_x[slot], self.prev_y[slot] = entity._prev_x, entity._prev_y
+		self.vel_x[slot], self.vel_y[slot] = getattr(entity, "_vel_x", 0), getattr(entity, "_vel_y", 0)
+		self.step_size[slot] = entity._step
+		self.size[slot] = (entity._width, entity._height)
+		self.offset[slot] = offset
+		self.spawn_area[slot] = getattr(entity, "_spawn_area", 0)
+		self.passes[slot] = getattr(entity, "_passes", 0)
+		self.hitbox[slot] = tuple(entity._hitbox)
+		self.count += 1
+		entity._store, entity._slot = self, slot
+		entity.__class__ = self._view_class(type(entity))
+		self.entities.append(entity)
+		return entity
+
+	# Take an entity out of the store, it becomes a plain entity again
+	def remove(self, entity) -> None:
+		slot, last = entity._slot, self.count-1
+		x, y, hitbox = self.x[slot].item(), self.y[slot].item(), self.hitbox[slot].tolist()
+		if slot != last:
+			# move the last row into the gap
+			for array in (self.kind, self.x, self.y, self.prev_x, self.prev_y, self.vel_x, self.vel_y, self.step_size,
+					self.size, self.offset, self.spawn_area, self.passes, self.hitbox):
+				array[slot] = array[last]
+			moved = self.entities[last]
+			moved._slot = slot
+			self.entities[slot] = moved
+		self.entities.pop()
+		self.count -= 1
+		entity.__class__ = type(entity).__bases__[1]
+		entity._x, entity._y = x, y
+		entity.snapshot()
+		entity._hitbox.update(hitbox)
+
+	# Recompute the hitbox of one row
+	def refresh(self, slot:int, offset:int) -> None:
+		self.hitbox[slot] = (int(self.x[slot]+offset), int(self.y[slot]+offset), self.size[slot, 0]-2*offset, self.size[slot, 1]-2*offset)
+
+	# Remember all positions as the start of the next tick
+	def snapshot(self) -> None:
+		n = self.count
+		self.prev_x[:n] = self.x[:n]
+		self.prev_y[:n] = self.y[:n]
+
+	# Advance every entity by one tick
+	def step(self) -> None:
+		n = self.count
+		if not n:
+			return
+		x, y, step = self.x[:n], self.y[:n], self.step_size[:n]
+		hitbox, size, offset = self.hitbox[:n], self.size[:n], self.offset[:n]
+		balls = self.kind[:n] == BALL
+		aliens = ~balls
+
+		# Balls bounce off walls like a dvd logo
+		vel_x, vel_y = self.vel_x[:n], self.vel_y[:n]
+		if self._continuous:
+			self._bounce(balls)
+			x -= numpy.where(balls, 0, step)
+		else:
+			vel_x[balls & (hitbox[:, 0] <= self._min_x)] = 1
+			vel_x[balls & (hitbox[:, 0] >= self._max_x-hitbox[:, 2])] = -1
+			vel_y[balls & (hitbox[:, 1] <= self._min_y)] = 1
+			vel_y[balls & (hitbox[:, 1] > self._max_y-hitbox[:, 3])] = -1
+			x += numpy.where(balls, step*vel_x, -step)
+			y += numpy.where(balls, step*vel_y, 0)
+
+		# Aliens leaving the screen respawn on the right in a random lane (in slot order, so the
+		# random number stream matches the per-object movement)
+		for slot in numpy.flatnonzero(aliens & (x <= -size[:, 0])).tolist():
+			self.passes[slot] += 1
+			if self._max_passes is not None and self.passes[slot] >= self._max_passes:
+				# left the screen for good
+				self.entities[slot].alive = False
+				continue
+			x[slot] = self._respawn_x
+			y[slot] = self._min_y+self.rng.randint(1, 4)*self.spawn_area[slot]
+			self.prev_x[slot], self.prev_y[slot] = x[slot], y[slot]
+
+		hitbox[:, 0] = (x+offset).astype(numpy.int64)
+		hitbox[:, 1] = (y+offset).astype(numpy.int64)
+		hitbox[:, 2] = size[:, 0]-2*offset
+		hitbox[:, 3] = size[:, 1]-2*offset
+
+	# Move the balls with their bounces inside the field (vectorized collision.bounce)
+	def _bounce(self, balls) -> None:
+		n = self.count
+		size, step, offset = self.size[:n], self.step_size[:n], self.offset[:n]
+		for position, velocity, low, high, length in ((self.x[:n], self.vel_x[:n], self._min_x, self._max_x, size[:, 0]), (self.y[:n], self.vel_y[:n], self._min_y, self._max_y, size[:, 1])):
+			delta = step*velocity
+			span = numpy.maximum(high-(length-2*offset)-low, 0)
+			# unfold the bounces into a straight line, every second span runs backwards
+			unfolded = numpy.mod(numpy.clip(position+offset-low, 0, span)+delta, numpy.maximum(2*span, 1))
+			forward = unfolded < span
+			direction = numpy.where(delta >= 0, 1, -1)
+			position[balls] = (low+numpy.where(forward, unfolded, 2*span-unfolded)-offset)[balls]
+			velocity[balls] = numpy.where(forward, direction, -direction)[balls]
+
+	# Which hitboxes overlap rect (boolean per row)
+	def _overlaps(self, rect):
+		hitbox = self.hitbox[:self.count]
+		x, y, w, h = rect
+		return (hitbox[:, 2] > 0) & (hitbox[:, 3] > 0) & (hitbox[:, 0] < x+w) & (x < hitbox[:, 0]+hitbox[:, 2]) & (hitbox[:, 1] < y+h) & (y < hitbox[:, 1]+hitbox[:, 3])
+
+	# Does any stored entity overlap rect
+	def collides(self, rect) -> bool:
+		if not self.count:
+			return False
+		return bool(numpy.any(self._overlaps(rect)))
+
+	# Stored entities whose hitbox overlaps rect
+	def overlapping(self, rect) -> list:
+		if not self.count:
+			return []
+		return [self.entities[slot] for slot in numpy.flatnonzero(self._overlaps(rect)).tolist()]
+
+	# Stored entities whose hitbox, moving from its previous position, overlaps rect moving by (dx, dy)
+	# in the same tick, as (entity, enter, leave) with the times they start and stop overlapping
+	# (vectorized collision.sweep)
+	def sweeping(self, rect, dx:float, dy:float) -> list:
+		n = self.count
+		if not n or rect[2] <= 0 or rect[3] <= 0:
+			return []
+		hitbox = self.hitbox[:n]
+		moved_x, moved_y = self.x[:n]-self.prev_x[:n], self.y[:n]-self.prev_y[:n]
+		enter, leave = numpy.zeros(n), numpy.ones(n)
+		valid = (hitbox[:, 2] > 0) & (hitbox[:, 3] > 0)
+		with numpy.errstate(divide="ignore", invalid="ignore"):
+			for start, size, delta, low, length in ((hitbox[:, 0]-moved_x, hitbox[:, 2], moved_x-dx, rect[0], rect[2]), (hitbox[:, 1]-moved_y, hitbox[:, 3], moved_y-dy, rect[1], rect[3])):
+				resting = delta == 0
+				valid &= ~resting | ((start+size > low) & (start < low+length))
+				# the leading edge reaches the target, the trailing edge leaves it
+				first, last = (low-start-size)/delta, (low+length-start)/delta
+				backwards = delta < 0
+				first, last = numpy.where(backwards, last, first), numpy.where(backwards, first, last)
+				enter = numpy.where(resting, enter, numpy.maximum(enter, first))
+				leave = numpy.where(resting, leave, numpy.minimum(leave, last))
+		return [(self.entities[slot], enter[slot].item(), leave[slot].item()) for slot in numpy.flatnonzero(valid & (enter < leave)).tolist()]
@@ -0,0 +1,176 @@
+# Gym-style environments around the headless game logic (optional, needs numpy)
+# An action is a bitmask of the held keys (W, A, S, D, F as in replay.KEYS), an observation a small
+# float32 vector: the player state followed by the nearest entities relative to the player.
+#   env = MurimuriEnv(); obs, info = env.reset(seed=1); obs, reward, terminated, truncated, info = env.step(1)
+# VectorEnv steps many games in one process, ProcessVectorEnv spreads them over worker processes.
+import multiprocessing
+import os
+import random
+import main
+import replay
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+ACTIONS = 1 << 5	# W, A, S, D and F pressed or not
+KINDS = {"ball": 1, "alien": 2, "cactus": 3}	# entity kind in observations (0: no entity)
+PLAYER_FEATURES = 7
+
+class MurimuriEnv():
+	# frame_skip: ticks an action is held for, max_ticks: ticks until an episode is truncated,
+	# nearest: entities in an observation, params: balance overrides (gravity, jump_height, speed
+	# as in Player.tune, waves as in main.load_schedule)
+	def __init__(self, frame_skip:int=4, max_ticks:int=main.TPS*300, nearest:int=8, store:bool=False, params:dict=None):
+		if numpy is None:
+			raise RuntimeError("The environments need numpy (pip install numpy)")
+		main.headless()
+		self.frame_skip = frame_skip
+		self.max_ticks = max_ticks
+		self.nearest = nearest
+		self.params = dict(params or ())
+		self.observation_size = PLAYER_FEATURES+3*nearest
+		self.action_count = ACTIONS
+		self._seeds = random.Random()	# seeds of the following episodes
+		self.game = main.Game(clock=main.TickClock(main.TPS), rng=random.Random(), store=store, tps=main.TPS, schedule=main.load_schedule(self.params.get("waves")))
+		self._tune()
+
+	def _tune(self) -> None:
+		self.game.player.tune(self.params.get("gravity"), self.params.get("jump_height"), self.params.get("speed"))
+
+	# seed: makes this and every following episode reproducible
+	def reset(self, seed:int=None, options:dict=None) -> tuple:
+		if seed is not None:
+			self._seeds.seed(seed)
+		self.game.reset(clock=main.TickClock(main.TPS), rng=random.Random(self._seeds.getrandbits(32)))
+		self._tune()
+		return self.observation(), self.info()
+
+	def step(self, action:int) -> tuple:
+		game = self.game
+		keys = replay.STATES[int(action) & (ACTIONS-1)]
+		start = game.ticks
+		for _ in range(self.frame_skip):
+			if game.over or game.ticks >= self.max_ticks:
+				break
+			game.update(keys)
+			game.clock.tick(main.TPS)
+		# one point per tick survived
+		return self.observation(), float(game.ticks-start), game.over, not game.over and game.ticks >= self.max_ticks, self.info()
+
+	def info(self) -> dict:
+		return {"ticks": self.game.ticks, "elapsed": self.game.elapsed, "hp": self.game.player.hp}
+
+	# Player position (0-1 in the field), health, flight stamina, flying, jumping and vertical speed,
+	# then offset (in field sizes) and kind of the nearest entities
+	def observation(self):
+		game, player = self.game, self.game.player
+		width, height = main.FIELDSIZE
+		observation = numpy.zeros(self.observation_size, numpy.float32)
+		observation[:PLAYER_FEATURES] = (
+			(player.hitbox.centerx-main.minPos[0])/width,
+			(player.hitbox.centery-main.minPos[1])/height,
+			player.hp/player.max_hp,
+			player.flight_stamina/player.max_flight_time,
+			player.isFlying,
+			player.isJumping,
+			player.vel_jump/player.jump_height if player.jump_height else 0,
+		)
+		if game.entities and self.nearest:
+			centers = numpy.array([entity.hitbox.center for entity in game.entities], numpy.float32)
+			offsets = (centers-player.hitbox.center)/(width, height)
+			order = numpy.argsort((offsets*offsets).sum(axis=1))[:self.nearest]
+			nearest = observation[PLAYER_FEATURES:].reshape(self.nearest, 3)
+			nearest[:len(order), :2] = offsets[order]
+			nearest[:len(order), 2] = [KINDS[game.entities[index].kind] for index in order.tolist()]
+		return observation
+
+	def close(self) -> None:
+		pass
+
+# Many independent games stepped together in one process
+# Finished games are reset right away, terminated/truncated mark the steps that ended an episode
+class VectorEnv():
+	def __init__(self, count:int, **options):
+		self.envs = [MurimuriEnv(**options) for _ in range(count)]
+		self.num_envs = count
+
+	def reset(self, seed:int=None, options:dict=None) -> tuple:
+		# game i gets seed+i, so a batch is reproducible from one seed
+		observations = [env.reset(None if seed is None else seed+index)[0] for index, env in enumerate(self.envs)]
+		return numpy.stack(observations), self._infos()
+
+	def step(self, actions) -> tuple:
+		observations = numpy.empty((self.num_envs, self.envs[0].observation_size), numpy.float32)
+		rewards = numpy.empty(self.num_envs, numpy.float32)
+		terminated = numpy.empty(self.num_envs, bool)
+		truncated = numpy.empty(self.num_envs, bool)
+		for index, (env, action) in enumerate(zip(self.envs, actions)):
+			observation, rewards[index], terminated[index], truncated[index], _ = env.step(action)
+			if terminated[index] or truncated[index]:
+				observation, _ = env.reset()
+			observations[index] = observation
+		return observations, rewards, terminated, truncated, self._infos()
+
+	def _infos(self) -> dict:
+		return {"ticks": numpy.array([env.game.ticks for env in self.envs]), "hp": numpy.array([env.game.player.hp for env in self.envs])}
+
+	def close(self) -> None:
+		pass
+
+def _worker(connection, count:int, options:dict) -> None:
+	envs = VectorEnv(count, **options)
+	while True:
+		command, data = connection.recv()
+		if command == "step":
+			connection.send(envs.step(data))
+		elif command == "reset":
+			connection.send(envs.reset(**data))
+		else:
+			break
+	connection.close()
+
+# Games spread over worker processes (each steps its share as a VectorEnv), throughput scales with cores
+class ProcessVectorEnv():
+	def __init__(self, count:int, workers:int=None, **options):
+		workers = max(1, min(count, workers or os.cpu_count() or 1))
+		# games per worker, the first ones take the remainder
+		self._sizes = [count//workers+(index < count%workers) for index in range(workers)]
+		self.num_envs = count
+		# spawned workers start with a fresh SDL instead of a forked copy of this one
+		context = multiprocessing.get_context("spawn")
+		self._connections, self._processes = list(), list()
+		for size in self._sizes:
+			parent, child = context.Pipe()
+			process = context.Process(target=_worker, args=(child, size, options), daemon=True)
+			process.start()
+			child.close()
+			self._connections.append(parent)
+			self._processes.append(process)
+
+	def _gather(self, results:list) -> tuple:
+		arrays = list(zip(*results))
+		infos = {key: numpy.concatenate([info[key] for info in arrays[-1]]) for key in arrays[-1][0]}
+		return (*(numpy.concatenate(parts) for parts in arrays[:-1]), infos)
+
+	def reset(self, seed:int=None, options:dict=None) -> tuple:
+		first = 0
+		for connection, size in zip(self._connections, self._sizes):
+			connection.send(("reset", {"seed": None if seed is None else seed+first}))
+			first += size
+		return self._gather([connection.recv() for connection in self._connections])
+
+	def step(self, actions) -> tuple:
+		first = 0
+		for connection, size in zip(self._connections, self._sizes):
+			connection.send(("step", actions[first:first+size]))
+			first += size
+		return self._gather([connection.recv() for connection in self._connections])
+
+	def close(self) -> None:
+		for connection in self._connections:
+			connection.send(("close", None))
+			connection.close()
+		for process in self._processes:
+			process.join()
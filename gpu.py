@@ -0,0 +1,87 @@
+# Hardware accelerated drawing with SDL's renderer (pygame._sdl2.video)
+# Surfaces are uploaded once and drawn as textures, tints are texture color modulation instead of
+# blended copies. Without a usable GPU driver SDL's software renderer is used, so the same code
+# runs (and can be tested) everywhere.
+import weakref
+import pygame
+
+try:
+	from pygame._sdl2 import sdl2, video
+except ImportError:
+	video = None
+
+class TextureDisplay():
+	# size: logical resolution everything is drawn at (the renderer scales it to the window)
+	# accelerated: try the GPU first (False: always the software renderer)
+	def __init__(self, size:tuple, title:str="", accelerated:bool=True, **flags):
+		if video is None:
+			raise RuntimeError("The texture renderer needs pygame 2 with pygame._sdl2")
+		self.window = video.Window(title, size=size, **flags)
+		self.renderer = None
+		if accelerated:
+			try:
+				self.renderer = video.Renderer(self.window, accelerated=1)
+			except (pygame.error, sdl2.error):
+				pass	# no GPU render driver, fall back to software
+		self.accelerated = self.renderer is not None
+		if self.renderer is None:
+			self.renderer = video.Renderer(self.window, accelerated=0)
+		self.renderer.logical_size = size	# letterboxed into any window size
+		self.screen = pygame.Surface(size)	# software-drawn frames (see show)
+		self._textures = weakref.WeakKeyDictionary()	# surface -> texture, dropped with the surface
+		self._tinted = dict()	# (surface, color) -> video.Image of the surface's texture
+
+	# Texture of a surface, uploaded on first use (call refresh after drawing into the surface)
+	def texture(self, surface:pygame.Surface):
+		texture = self._textures.get(surface)
+		if texture is None:
+			texture = self._textures[surface] = video.Texture.from_surface(self.renderer, surface)
+		return texture
+
+	# Upload a surface again after it was changed
+	def refresh(self, surface:pygame.Surface) -> None:
+		texture = self._textures.get(surface)
+		if texture is not None:
+			texture.update(surface)
+
+	# A surface drawn multiplied by an RGBA color (like resources.tint, without a blended copy)
+	def tinted(self, surface:pygame.Surface, color:tuple):
+		key = (surface, tuple(color))
+		image = self._tinted.get(key)
+		if image is None:
+			image = self._tinted[key] = video.Image(self.texture(surface))
+			image.color = pygame.Color(color[0], color[1], color[2])
+			image.alpha = color[3] if len(color) > 3 else 255
+		return image
+
+	# Draw (source, position) pairs, sources are surfaces, textures or images (Surface.blits-like,
+	# so a renderqueue.RenderQueue can be submitted to the display)
+	def blits(self, commands, doreturn:bool=False) -> list:
+		texture = self.texture
+		for source, position in commands:
+			if isinstance(source, pygame.Surface):
+				source = texture(source)
+			source.draw(dstrect=position)
+		return []
+
+	def fill(self, color:tuple) -> None:
+		self.renderer.draw_color = pygame.Color(color)
+		self.renderer.clear()
+
+	# Outline rects (e.g. debug hitboxes)
+	def rects(self, rects, color:tuple, width:int=1) -> None:
+		renderer = self.renderer
+		renderer.draw_color = pygame.Color(color)
+		for rect in rects:
+			for inset in range(width):
+				renderer.draw_rect(pygame.Rect(rect).inflate(-2*inset, -2*inset))
+
+	def present(self) -> None:
+		self.renderer.present()
+
+	# Show the software-drawn screen surface (e.g. menus), its one texture is updated in place
+	def show(self) -> None:
+		self.fill((0, 0, 0))
+		self.refresh(self.screen)
+		self.texture(self.screen).draw()
+		self.renderer.present()
@@ -0,0 +1,103 @@
+# HUD and text rendering with shared fonts and cached surfaces
+import pygame
+from collections import OrderedDict
+
+_fonts = dict()
+
+# Shared font instance (pygame's default font when name is None)
+def font(size:int, name:str=None) -> pygame.font.Font:
+	key = (name, size)
+	cached = _fonts.get(key)
+	if cached is None:
+		cached = _fonts[key] = pygame.font.Font(name, size)
+	return cached
+
+# Least recently used cache of rendered surfaces
+class LRUCache():
+	def __init__(self, maxsize:int=256):
+		self.maxsize = maxsize
+		self._items = OrderedDict()
+		self.hits, self.misses = 0, 0
+
+	def get(self, key, build):
+		items = self._items
+		surface = items.get(key)
+		if surface is not None:
+			items.move_to_end(key)
+			self.hits += 1
+			return surface
+		self.misses += 1
+		surface = items[key] = build()
+		if len(items) > self.maxsize:
+			items.popitem(last=False)
+		return surface
+
+	def clear(self) -> None:
+		self._items.clear()
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+texts = LRUCache(256)	# whole strings
+glyphs = LRUCache(512)	# single characters
+
+# Rendered string, cached by its text, font and colors
+def text(string:str, size:int, color:tuple, background:tuple=None, antialias:bool=True, name:str=None) -> pygame.Surface:
+	return texts.get((string, size, color, background, antialias, name), lambda: font(size, name).render(string, antialias, color, background))
+
+# Cached glyphs of a string that changes every frame (e.g. a timer) as (surface, position) pairs
+# for Surface.blits, and the area they cover
+# center: x coordinate the string is centered on, top: y coordinate of its top edge
+def glyph_blits(string:str, size:int, color:tuple, center:int, top:int, name:str=None) -> tuple[list, pygame.Rect]:
+	rendered = [glyphs.get((char, size, color, name), lambda char=char: font(size, name).render(char, True, color)) for char in string]
+	width = sum(glyph.get_width() for glyph in rendered)
+	x = center-width//2
+	blits = list()
+	for glyph in rendered:
+		blits.append((glyph, (x, top)))
+		x += glyph.get_width()
+	return blits, pygame.Rect(center-width//2, top, width, font(size, name).get_height())
+
+# Draw a string from cached glyphs (see glyph_blits), returns the area drawn to
+def draw_glyphs(screen, string:str, size:int, color:tuple, center:int, top:int, name:str=None) -> pygame.Rect:
+	blits, area = glyph_blits(string, size, color, center, top, name)
+	screen.blits(blits, doreturn=False)
+	return area
+
+# Lines of text on a (translucent) background panel, in a monospace font if one is installed
+def text_panel(lines:list, size:int, color:tuple, background:tuple, padding:int=6) -> pygame.Surface:
+	panel_font = font(size, pygame.font.match_font("dejavusansmono,couriernew,monospace"))
+	rendered = [panel_font.render(line, True, color) for line in lines]
+	width = max((line.get_width() for line in rendered), default=0)+2*padding
+	height = len(rendered)*panel_font.get_linesize()+2*padding
+	panel = pygame.Surface((width, height), pygame.SRCALPHA)
+	panel.fill(background)
+	for index, line in enumerate(rendered):
+		panel.blit(line, (padding, padding+index*panel_font.get_linesize()))
+	return panel
+
+# Health and flight stamina bars of an entity, only rebuilt when the values change
+class StatusBars():
+	HEIGHT = 25	# health bar at the top, stamina bar 15 pixels below it (both 10 pixels high)
+
+	def __init__(self, width:int):
+		self._width = width
+		self._state = None
+		self._surface = pygame.Surface((width, self.HEIGHT), pygame.SRCALPHA)
+
+	def get(self, hp:float, max_hp:float, stamina:float, max_stamina:float) -> pygame.Surface:
+		state = (hp, max_hp, stamina, max_stamina)
+		if state != self._state:
+			self._state = state
+			self._draw(*state)
+		return self._surface
+
+	def _draw(self, hp:float, max_hp:float, stamina:float, max_stamina:float) -> None:
+		surface, width = self._surface, self._width
+		surface.fill((0, 0, 0, 0))
+		# Health bar
+		pygame.draw.rect(surface, (255, 0, 0), (0, 0, int(width * (hp / max_hp)), 10))
+		pygame.draw.rect(surface, (255, 128, 0), (0, 0, width, 10), 2)  # outline
+		# Flight stamina bar
+		pygame.draw.rect(surface, (0, 0, 255), (0, 15, int(width * (stamina / max_stamina)), 10))
+		pygame.draw.rect(surface, (0, 128, 255), (0, 15, width, 10), 2)  # outline
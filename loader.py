@@ -0,0 +1,36 @@
+# Asynchronous asset loading
+# Assets are decoded on a thread pool (e.g. while the title screen is shown), the game only waits
+# for the ones that are not ready yet when it needs them.
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class AssetLoader():
+	def __init__(self, workers:int=4):
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+		self.futures = dict()	# name -> Future of the load
+
+	# Start loading an asset, function(*args) runs on a worker thread
+	def submit(self, name:str, function, *args):
+		future = self.futures[name] = self._executor.submit(function, *args)
+		return future
+
+	# Finished and total loads
+	@property
+	def progress(self) -> tuple[int, int]:
+		return sum(future.done() for future in self.futures.values()), len(self.futures)
+
+	@property
+	def done(self) -> bool:
+		return all(future.done() for future in self.futures.values())
+
+	# Result of a load, blocks until it is ready (and raises its exception if it failed)
+	def result(self, name:str):
+		return self.futures[name].result()
+
+	# Block until every load has finished, raises the first exception of a failed load
+	def wait(self) -> None:
+		wait(self.futures.values())
+		for future in self.futures.values():
+			future.result()
+
+	def shutdown(self) -> None:
+		self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,10 +1,38 @@
 # import the pygame module, so you can use it
+import argparse
+import collections
+import json
+import math
+import os
 import pygame
 import random
+import time
+import warnings
 import Textrect
+import atlas
+import collision
+import entitystore
+import gpu
+import hud
+import loader
+import pool
+import profiler
+import renderqueue
+import replay
+import resources
+import scene
+import spawner
 
 WIDTH, HEIGHT = 1920, 1080
-TPS = 120
+TPS = 120			# simulation ticks per second (fixed timestep)
+FPS = 120			# rendered frames per second (independent of TPS)
+TUNED_TPS = 120		# tick rate the per-tick speeds, gravity and jump height were tuned for
+MAX_FRAME_TIME = 0.25	# longest frame (seconds) the simulation catches up on
+INTERPOLATE = True	# draw sprites between the last two simulation ticks
+PROFILE = False		# time every phase of a frame (the overlay can also be toggled with F3)
+TRACE_FILE = None	# write a Chrome trace of the last TRACE_FRAMES frames to this file when the game ends
+TRACE_FRAMES = 600
+RECORD_FILE = None	# write the seed and keys of every round to this replay file (the last round is kept)
 FIELDSIZE = (1024,512)
 PRIMARY_COLOR = (255,235,254)
 
@@ -13,17 +41,63 @@ HITBOX_WIDTH = 4
 MUSIC_VOLUME = 0.5
 
 SHOW_HITBOXES = False
+PIXEL_COLLISION = True	# hitboxes only preselect, a hit needs overlapping opaque sprite pixels
+CONTINUOUS_COLLISION = False	# sweep hitboxes over each tick (no missed hits or walls at low tick rates and high speeds)
+SWEEP_STEP = 4		# pixels between the sprite mask tests along a swept movement
+DIRTY_RECTS = True	# only redraw and push the parts of the screen that changed
+TEXTURE_RENDERER = False	# draw with SDL's renderer (GPU textures, SDL's software renderer without a GPU)
+RENDER_RESOLUTION = None	# draw the game world at this (width, height) and upscale it to the window (None: window resolution)
+
+# Key state with nothing pressed (headless runs without inputs)
+NO_INPUT = collections.defaultdict(bool)
 
-GAME_END = False
 
 ## Player
 PLAYER_SIZE = 125
 PLAYER_SPEED = DEFAULT_SPEED
 
+# Player sprite tints (multiplied with the sprite)
+NORMAL_TINT = (255, 255, 255, 255)
+DAMAGE_TINT = (120, 120, 120, 255)
+GAME_OVER_TINT = (255, 255, 255, 128)
+
 ## Ball
 BALL_SIZE = 120
 BALL_SPEED = DEFAULT_SPEED
 
+## Entity lifecycle
+POOL_CAPACITY = 1024	# most entities of one type alive at the same time (None: unlimited), later spawns are dropped with a warning
+# classic spawns: one entity every 5s, 10s, 15s, ... (cacti on even cycles, balls on every 5th, else aliens)
+CLASSIC_SCHEDULE = spawner.Schedule(cycles=spawner.Cycles(5000, ((2, "cactus"), (5, "ball")), "alien"))
+WAVES_FILE = None	# spawn schedule file (see spawner.load), None: the classic schedule
+ALIEN_PASSES = None		# screen crossings before an alien/cactus despawns (None: they wrap forever, see --passes)
+
+## Draw order (render queue layers, lower layers are drawn first)
+LAYER_CACTUS = 0
+LAYER_ALIEN = 1
+LAYER_BALL = 2
+LAYER_PLAYER = 3
+LAYER_HUD = 4
+
+## Sprites (registry handles, decoded once per process)
+BALL_IMAGE = resources.handle("./assets/pellet.png", (100, 100))
+ALIEN_IMAGE = resources.handle("./assets/alien.png", (100, 100))
+CACTUS_IMAGE = resources.handle("./assets/cactus.png", (25, 200))
+PLAYER_IMAGES = [resources.handle("./assets/player_00.png", (PLAYER_SIZE, PLAYER_SIZE)), resources.handle("./assets/player_01.png", (PLAYER_SIZE, PLAYER_SIZE))]
+LOGO_IMAGE = resources.handle("./assets/logo.png", (500, 500))	# title screen and window icon
+BACKGROUND_IMAGE = resources.handle("./assets/background.jpg", alpha=False)
+
+## Prebuilt asset bundle (python atlas.py), the images are loaded one by one if it is missing or stale
+BUNDLE_FILE = "./assets/sprites.bundle"
+BUNDLE_IMAGES = [BALL_IMAGE, ALIEN_IMAGE, CACTUS_IMAGE, *PLAYER_IMAGES, LOGO_IMAGE, BACKGROUND_IMAGE]
+
+## Sound
+JUMP_SOUND = "./assets/sfx/jump.ogg"
+HIT_SOUND = "./assets/sfx/hit.ogg"
+TITLE_MUSIC = "./assets/sfx/titlescreen.ogg"
+GAME_MUSIC = "./assets/sfx/music.ogg"
+GAME_OVER_MUSIC = "./assets/sfx/gameover.ogg"
+
 minPos = (WIDTH//2-FIELDSIZE[0]//2, HEIGHT//2-FIELDSIZE[1]//2)
 maxPos = (WIDTH//2+FIELDSIZE[0]//2, HEIGHT//2+FIELDSIZE[1]//2)
 
@@ -35,44 +109,75 @@ def drawCorners(screen):
 	pygame.draw.circle(screen, (0, 255, 0), (maxPos[0], minPos[1]), 5)	# 3. Quadrant
 
 # Get random coordinates within the map
-def get_random_coords() -> tuple[int, int]:
-	return (random.randint(minPos[0], maxPos[0]), random.randint(minPos[1], maxPos[1]))
+def get_random_coords(rng=random) -> tuple[int, int]:
+	return (rng.randint(minPos[0], maxPos[0]), rng.randint(minPos[1], maxPos[1]))
+
+# Simulated clock for headless runs: every tick advances the time by exactly one frame
+class TickClock():
+	def __init__(self, tps:int=TPS):
+		self._ms = 0.0
+		self._frame = 1000/tps
+
+	def get_ticks(self) -> int:
+		return int(self._ms)
+
+	def tick(self, framerate:int=0) -> int:
+		self._ms += self._frame
+		return int(self._frame)
 
 # Entity 
 class Entity():	
-	def __init__(self, images:list, x:int, y:int, size:tuple=(100, 100), step=1.5, hitboxes:tuple=(0,0,0,0)):
-		# Image
+	# no per-instance __dict__, entities are created by the hundreds
+	__slots__ = ("_images", "_image", "_size", "_width", "_height", "_custom_hitbox", "_step", "_hitbox", "map_field",
+		"_hitboxOffset", "_x", "_y", "_prev_x", "_prev_y", "alive", "_store", "_slot")
+
+	def __init__(self, images:list, x:int, y:int, size:tuple=(100, 100), step=1.5, hitboxes:tuple=(0,0,0,0), scale:float=1.0):
+		# Image (surfaces, registry handles or paths that get scaled to size)
 		self._images = list()
 		for image in images:
 			if isinstance(image, pygame.Surface):
 				self._images.append(image)
+			elif isinstance(image, resources.ImageKey):
+				self._images.append(resources.image(image))
 			else:
-				self._images.append(pygame.transform.scale(pygame.image.load(image), size))
+				self._images.append(resources.image(image, size))
 		self._image = self._images[0]
 
 		# Size of Entity
 		self._size = size
 		self._width, self._height = self._image.get_size()
 		self._custom_hitbox = hitboxes
-		self._step = step
+		# pixels per tick, scale converts from TUNED_TPS to the actual tick rate
+		self._step = step*scale
+		# Hitbox and movement area are kept as persistent rects and updated in place
+		self._hitbox = pygame.Rect(0, 0, 0, 0)
+		self.map_field = pygame.Rect(0, 0, 0, 0)
+		self.alive = True	# False once the entity despawned
 		self.setPos(x, y)
 
 	# Set position of entity
 	def setPos(self, x:int, y:int) -> None:
 		self._x = x
 		self._y = y
+		self.snapshot()
 		self.refreshHitbox()
 
+	# Remember the current position as the start of the next tick (for render interpolation)
+	def snapshot(self) -> None:
+		self._prev_x, self._prev_y = self._x, self._y
+
+	# Position between the previous and the current tick, alpha in [0, 1]
+	def lerp(self, alpha:float) -> tuple:
+		return (self._prev_x+(self._x-self._prev_x)*alpha, self._prev_y+(self._y-self._prev_y)*alpha)
+
 	# Refresh hitbox
-	def refreshHitbox(self, offset=5, screen=None, color:tuple=(0,255,0)) -> None:
+	def refreshHitbox(self, offset=5) -> None:
 		self._hitboxOffset = offset
 		if self._custom_hitbox != (0,0,0,0):
-			self._hitbox = (self._x+offset, self._y+offset, self._custom_hitbox[2]-2*offset, self._custom_hitbox[3]-2*offset)
-		self.map_field = pygame.Rect(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
+			self._hitbox.update(self._x+offset, self._y+offset, self._custom_hitbox[2]-2*offset, self._custom_hitbox[3]-2*offset)
+		self.map_field.update(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
 		#				x, y, width, height
-		self._hitbox = (self._x+offset, self._y+offset, self._width-2*offset, self._height-2*offset)
-		if screen and SHOW_HITBOXES:
-			pygame.draw.rect(screen, color, self._hitbox, HITBOX_WIDTH)
+		self._hitbox.update(self._x+offset, self._y+offset, self._width-2*offset, self._height-2*offset)
 
 	# Check if the player is within the boundaries of the map
 	def boundariesCheck(self, x:int, y:int):
@@ -81,17 +186,48 @@ class Entity():
 			return True
 		return False
 	
+	# Do the opaque pixels of both sprites overlap (cached masks of the current frames)
+	# offset: position of other relative to this entity (None: their current positions)
+	def touches(self, other, offset:tuple=None) -> bool:
+		if offset is None:
+			offset = (int(other._x)-int(self._x), int(other._y)-int(self._y))
+		return resources.mask(self._image).overlap(resources.mask(other._image), offset) is not None
+
 	image = property(lambda self: self._image)
 	x = property(lambda self: self._x)
 	y = property(lambda self: self._y)
 	step = property(lambda self: self._step)
 	hitbox = property(lambda self: self._hitbox)
+	moved = property(lambda self: (self._x-self._prev_x, self._y-self._prev_y))	# movement since the last snapshot
+	stored = False	# True for views over an entitystore.EntityStore row
+	layer = LAYER_CACTUS	# render queue layer of the sprite (lowest by default)
 
 class Ball(Entity):
-	def __init__(self, x:int=0, y:int=0, direction=(1,1)):
-		super().__init__(images=["./assets/pellet.png"], x=x, y=y, step=3)
+	__slots__ = ("_vel_x", "_vel_y")
+	kind = "ball"	# spawn name and pool
+	layer = LAYER_BALL
+
+	def __init__(self, x:int=0, y:int=0, direction=(1,1), scale:float=1.0, velocity:float=3):
+		super().__init__(images=[BALL_IMAGE], x=x, y=y, step=velocity, scale=scale)
+		(self._vel_x, self._vel_y) = direction
+
+	# Reuse a pooled ball (same state as a new one)
+	def reset(self, x:int=0, y:int=0, direction=(1,1), scale:float=1.0, velocity:float=3) -> None:
+		self._step = velocity*scale
 		(self._vel_x, self._vel_y) = direction
-	def move(self, screen=None) -> None:
+		self.alive = True
+		self.setPos(x, y)
+
+	def move(self) -> None:
+		if CONTINUOUS_COLLISION:
+			# bounce exactly where the hitbox reaches a wall, however far the ball moves in a tick
+			offset = 20
+			width, height = self._width-2*offset, self._height-2*offset
+			x, self._vel_x = collision.bounce(self._x+offset, self._step*self._vel_x, minPos[0], maxPos[0]-width)
+			y, self._vel_y = collision.bounce(self._y+offset, self._step*self._vel_y, minPos[1], maxPos[1]-height)
+			self._x, self._y = x-offset, y-offset
+			self.refreshHitbox(offset=20)
+			return
 		# Enemy bounces off walls like a dvd logo
 		if self._hitbox[0] <= minPos[0]:
 			self._vel_x = 1
@@ -103,77 +239,138 @@ class Ball(Entity):
 		if self._hitbox[1] > maxPos[1]-self._hitbox[3]:
 			self._vel_y = -1
 		self._y += self._step * self._vel_y
-		self.refreshHitbox(offset=20, screen=screen, color=(255, 0, 0))
+		self.refreshHitbox(offset=20)
 
 # A wall that the player can't pass through and moves from right to left
 class Alien(Entity):
-	def __init__(self, images=["./assets/alien.png"], hitbox_offset:int=25, size=(100, 100)):
+	__slots__ = ("_rng", "_spawn_area", "_passes")
+	kind = "alien"
+	layer = LAYER_ALIEN
+
+	# lane: 1-4 from the top (None: random), velocity: pixels per tick at TUNED_TPS
+	def __init__(self, images=[ALIEN_IMAGE], hitbox_offset:int=25, size=(100, 100), rng=random, scale:float=1.0, lane:int=None, velocity:float=3):
 		# x = maxPos[0]
 		# y = minPos[1]+random.randint(1, 4)*self._spawn_area
-		super().__init__(images=images, x=maxPos[0], y=0, step=3, size=size)
+		super().__init__(images=images, x=maxPos[0], y=0, step=velocity, size=size, scale=scale)
 		self._spawn_area = ((FIELDSIZE[1]-self._height)//4)
-		self._y = minPos[1]+random.randint(1, 4)*self._spawn_area
+		self._enter(hitbox_offset, rng, lane)
+
+	# Reuse a pooled alien (same state as a new one)
+	def reset(self, rng=random, scale:float=1.0, lane:int=None, velocity:float=3) -> None:
+		hitbox_offset = self._hitboxOffset
+		self._step = velocity*scale
+		self.alive = True
+		self.setPos(maxPos[0], 0)
+		self._enter(hitbox_offset, rng, lane)
+
+	# Place the alien right of the screen in its lane (a random one if None)
+	def _enter(self, hitbox_offset:int, rng, lane:int=None) -> None:
+		self._rng = rng
+		self._passes = 0 # how often the alien crossed the screen
+		self._y = minPos[1]+(lane if lane is not None else self._rng.randint(1, 4))*self._spawn_area
 		self._x = WIDTH
+		self.snapshot()
 		self._hitboxOffset = hitbox_offset
 
-	def move(self, screen=None):
+	def move(self):
 		self._x -= 1*self._step
 		if self._x <= -self._width:
+			self._passes += 1
+			if ALIEN_PASSES is not None and self._passes >= ALIEN_PASSES:
+				# left the screen for good
+				self.alive = False
+				return
 			self._x = WIDTH
-			self._y = minPos[1]+random.randint(1, 4)*self._spawn_area
-		self.refreshHitbox(offset=self._hitboxOffset, screen=screen, color=(255, 0, 0))
+			self._y = minPos[1]+self._rng.randint(1, 4)*self._spawn_area
+			self.snapshot() # respawning is a jump, not a movement
+		self.refreshHitbox(offset=self._hitboxOffset)
 
 class Cactus(Alien):
-	def __init__(self, images=["./assets/cactus.png"],size:tuple=(25, 200)):
-		super().__init__(images=images, hitbox_offset=10, size=(25, 200))
+	__slots__ = ()
+	kind = "cactus"
+	layer = LAYER_CACTUS
+
+	def __init__(self, images=[CACTUS_IMAGE],size:tuple=(25, 200), rng=random, scale:float=1.0, lane:int=None, velocity:float=3):
+		super().__init__(images=images, hitbox_offset=10, size=(25, 200), rng=rng, scale=scale, lane=lane, velocity=velocity)
 
 class Player(Entity):
-	def __init__(self):
-		# Player states
+	layer = LAYER_PLAYER
+
+	def __init__(self, clock=pygame.time, scale:float=1.0):
+		# Source of game time (pygame.time or a TickClock)
+		self._clock = clock
+		# Conversion from TUNED_TPS to the actual tick rate
+		self._scale = scale
+
+		# Player states (refreshHitbox reads them while the entity is initialized)
 		self.isJumping, self.isFlying = False, False
 
 		# Flight variables
-		self.flight_stamina = 0
 		self.max_flight_time = 5
-		self.lastFlightToggle = pygame.time.get_ticks()
-		self.lastStaminaRegen = pygame.time.get_ticks()
 
 		# Sound effects
-		self.jump_sound = pygame.mixer.Sound("./assets/sfx/jump.ogg")
-		self.hit_sound = pygame.mixer.Sound("./assets/sfx/hit.ogg")
-		pygame.mixer.Sound.set_volume(self.hit_sound, 0.5)
-		pygame.mixer.Sound.set_volume(self.jump_sound, 0.5)
+		self.jump_sound = resources.sound(JUMP_SOUND, 0.5)
+		self.hit_sound = resources.sound(HIT_SOUND, 0.5)
 
 		# Player movement variables
-		self.gravity = 0.2
-		self.jump_height = 7.5
-		self.vel_jump = self.jump_height
-		(self.vel_x, self.vel_y) = 0, 0
+		self.gravity = 0.2*scale*scale
+		self.jump_height = 7.5*scale
 
 		# Health
 		self.max_hp = 100
-		self.hp = self.max_hp
-		self.last_damaged = pygame.time.get_ticks()
 
 		# Initialize entity properties
-		super().__init__(images=["./assets/player_00.png", "./assets/player_01.png"], x=0, y=0, size=(PLAYER_SIZE,PLAYER_SIZE), step=PLAYER_SPEED)
+		self._status_bars = hud.StatusBars(PLAYER_SIZE)
+		super().__init__(images=PLAYER_IMAGES, x=0, y=0, size=(PLAYER_SIZE,PLAYER_SIZE), step=PLAYER_SPEED, scale=scale)
+		# precompute every tinted variant of every frame (normal, damage flash, game over)
+		for image in self._images:
+			for color in (NORMAL_TINT, DAMAGE_TINT, GAME_OVER_TINT):
+				resources.tint(image, color)
+		self.reset()
+
+	# Start a new life in place: full health, no flight stamina, walking
+	def reset(self) -> None:
+		self.isJumping, self.isFlying = False, False
+		self.flight_stamina = 0
+		self.lastFlightToggle = self._clock.get_ticks()
+		self.lastStaminaRegen = self._clock.get_ticks()
+		self.vel_jump = self.jump_height
+		(self.vel_x, self.vel_y) = 0, 0
+		self.hp = self.max_hp
+		self.last_damaged = self._clock.get_ticks()
+		self.update_image(0)
 		self.update_darkness(255)
+		self.refreshHitbox()	# walking movement area, default hitbox offset
+
+	# Override movement constants (per tick at TUNED_TPS, None keeps the current value), e.g. to tune
+	# the balance headless
+	def tune(self, gravity:float=None, jump_height:float=None, speed:float=None) -> None:
+		if gravity is not None:
+			self.gravity = gravity*self._scale*self._scale
+		if jump_height is not None:
+			self.jump_height = jump_height*self._scale
+			self.vel_jump = self.jump_height
+		if speed is not None:
+			self._step = speed*self._scale
 
 	def update_darkness(self, val:int=0):
-		self._dark_overlay = pygame.Surface((self.image.get_width(), self.image.get_height()), pygame.SRCALPHA)
-		self._dark_overlay.fill((val, val, val))
+		self._darkness = (val, val, val, 255)
+
+	# Current frame multiplied by the darkness (cached, no per-frame blending)
+	tinted_image = property(lambda self: resources.tint(self._image, self._darkness))
+	tint = property(lambda self: self._darkness)	# RGBA the current frame is multiplied with
 
-	def move(self, screen=None) -> None:
+	def move(self) -> None:
 		if self.isJumping:
 			self.vel_jump -= self.gravity
 			self._y -= self.vel_jump
 			# force non-flight mode (dirty fix)
-			self.map_field = pygame.Rect(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
+			self.map_field.update(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
 
 			# if player hits the ceiling
 			if self._y < self.map_field[1]:
 				self._y = self.map_field[1]
-				self.vel_jump = -0.2
+				self.vel_jump = -0.2*self._scale
 
 			# if player is on the floor
 			if self.map_field[1]+self.map_field[3] <= (self._y+self._height-self._hitboxOffset):
@@ -185,12 +382,21 @@ class Player(Entity):
 		elif self.isFlying:
 			if self.boundariesCheck(0, self.vel_y):
 				self._y += self.vel_y
+			elif CONTINUOUS_COLLISION:
+				self._y += self.vel_y*self.edge_time(0, self.vel_y)
 
 		if self.boundariesCheck(self.vel_x, 0):
 			self._x += self.vel_x
+		elif CONTINUOUS_COLLISION:
+			self._x += self.vel_x*self.edge_time(self.vel_x, 0)
 
-		self.draw_healthbar(screen)
-		self.refreshHitbox(screen=screen, offset=20)
+		self.refreshHitbox(offset=20)
+
+	# Share (0-1) of a move the player can make before leaving the movement area, so it stops at the
+	# edge instead of short of it (boundariesCheck tests the top left corner of the hitbox)
+	def edge_time(self, x:float, y:float) -> float:
+		impact = collision.bounds_impact((self._hitbox[0], self._hitbox[1], 1, 1), x, y, self.map_field)
+		return 1.0 if impact is None else impact
 
 	def update_image(self, id:int=0) -> None:
 		self._image = self._images[id]
@@ -198,9 +404,9 @@ class Player(Entity):
 	# Toggle flight mode
 	def toggleFlight(self, force:bool=None) -> None:
 		# prevent spamming (500ms cooldown)
-		if pygame.time.get_ticks() - self.lastFlightToggle < 500:
+		if self._clock.get_ticks() - self.lastFlightToggle < 500:
 			return
-		self.lastFlightToggle = pygame.time.get_ticks()
+		self.lastFlightToggle = self._clock.get_ticks()
 		if force != None:
 			self.isFlying = force
 		else:
@@ -223,269 +429,912 @@ class Player(Entity):
 	
 	# Trigger hit event
 	def hit(self) -> None:
-		if pygame.time.get_ticks() - self.last_damaged < 1000:
+		if not self.vulnerable:
 			return
 		pygame.mixer.Sound.play(self.hit_sound)
-		self.last_damaged = pygame.time.get_ticks()
-		self.update_darkness(120)
+		self.last_damaged = self._clock.get_ticks()
+		self.update_darkness(DAMAGE_TINT[0])
 		self.hp -= 34
 		if self.hp <= 0:
 			self.hp = 0
-			global GAME_END
-			GAME_END = True
-
-	def draw_healthbar(self, screen) -> None:
-		# Set the position and size of the health bar
-		position = (self._x, self._y - 20)  # 20 pixels above the player
-		size = (self._width, 10)  # 10 pixels high
-
-		# Calculate the length of the health bar
-		hp_length = int(size[0] * (self.hp / self.max_hp))
 
-		# Draw the health bar
-		pygame.draw.rect(screen, (255, 0, 0), (*position, hp_length, size[1]))
-		pygame.draw.rect(screen, (255, 128, 0), (*position, *size), 2)  # outline
-
-		# Draw flight stamina bar
-		position = (self._x, self._y - 5)  # 20 pixels above the player
-		size = (self._width, 10)  # 10 pixels high
-	
-		stamina_length = int(size[0] * (self.flight_stamina / self.max_flight_time))
-		pygame.draw.rect(screen, (0, 0, 255), (*position, stamina_length, size[1]))
-		pygame.draw.rect(screen, (0, 128, 255), (*position, *size), 2)  # outline
+	# Hits only count again 1s after the last one
+	vulnerable = property(lambda self: self._clock.get_ticks() - self.last_damaged >= 1000)
 
+	# pre-rendered bars, only redrawn when hp or flight stamina change
+	healthbar = property(lambda self: self._status_bars.get(self.hp, self.max_hp, self.flight_stamina, self.max_flight_time))
 
 	# Player-specific hitbox
-	def refreshHitbox(self, offset=5, screen=None, color:tuple=(0,255,0)) -> None:
+	def refreshHitbox(self, offset=5) -> None:
 		self._hitboxOffset = offset
 		if self.isFlying:
-			self.map_field = pygame.Rect(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1]-self._hitboxOffset*4)
+			self.map_field.update(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1]-self._hitboxOffset*4)
 		else:
-			self.map_field = pygame.Rect(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
+			self.map_field.update(minPos[0], minPos[1], maxPos[0]-minPos[0]-self._hitboxOffset*4, maxPos[1]-minPos[1])
 		#				x, y, width, height
-		self._hitbox = (self._x+offset, self._y+offset, self._width-2*offset, self._height-2*offset)
-		if screen and SHOW_HITBOXES:
-			pygame.draw.rect(screen, color, self._hitbox, HITBOX_WIDTH)
+		self._hitbox.update(self._x+offset, self._y+offset, self._width-2*offset, self._height-2*offset)
 
-def main():
-	global TPSCLOCK
-	TPSCLOCK = pygame.time.Clock()
-	pygame.init()
-	logo = pygame.image.load("./assets/logo.png")
-	pygame.display.set_icon(logo)
-	pygame.display.set_caption("murimuri adventures")
-	title_screen()
-	# runGame()
-
-def title_screen():
-	screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.WINDOWMAXIMIZED)
-
-	# Load song
-	pygame.mixer.music.load("./assets/sfx/titlescreen.ogg")
-	pygame.mixer.music.set_volume(MUSIC_VOLUME)
-	pygame.mixer.music.play(loops=-1)
-
-	# Preload asset
-	logo = pygame.image.load("./assets/logo.png")
-	logo = pygame.transform.scale(logo, (500, 500))
-
-	waiting = True
-	while waiting:
-		for event in pygame.event.get():
-			if event.type == pygame.KEYDOWN:
-				if pygame.key.get_pressed()[pygame.K_w]:
-					waiting = False
-			if event.type == pygame.QUIT:
-				pygame.quit()
-				return
-		### Main Menu
-		screen.fill(PRIMARY_COLOR)
-		screen.blit(logo, (WIDTH//2-logo.get_width()//2, HEIGHT//2-logo.get_height()//2-200))
+# Game world: everything that happens in one tick of gameplay, without any drawing
+class Game():
+	# capacity: most entities of one type alive at the same time (None: unlimited)
+	def __init__(self, clock=pygame.time, rng=random, store:bool=False, tps:int=TPS, schedule:spawner.Schedule=CLASSIC_SCHEDULE, capacity:int=POOL_CAPACITY):
+		self.clock = clock	# anything with get_ticks() (pygame.time or a TickClock)
+		self.rng = rng		# anything with randint() (random or a seeded random.Random)
+		# optional numpy entity store that moves all balls and aliens in one vectorized step
+		self.store = entitystore.EntityStore((minPos, maxPos), WIDTH, rng, passes=ALIEN_PASSES, continuous=CONTINUOUS_COLLISION) if store else None
+		self.scale = TUNED_TPS/tps	# per-tick speeds are tuned for TUNED_TPS
+		self.interpolate = False	# keep the previous positions for render interpolation
+		self.profiler = None		# optional profiler.FrameProfiler, phases are booked with lap()
+		self.pixel_collision = PIXEL_COLLISION
 
-		# Draw Textbox
-		font = pygame.font.Font(None, 45)
-		string = '''
-Controls:
-- Use WASD controls to move
-- Press [F] to toggle Flightmode\n
-Gameplay:
-Survive for as long as you can!
-You can only fly for a limited time\n
-* Press the W key to start! *'''
-		rect = pygame.Rect((0, 0, 500, 400))
-		text = Textrect.render_textrect(string, font, rect, (0,0,0), (255,255,255), 1)
-		screen.blit(text, (WIDTH//2-text.get_width()//2, HEIGHT//2-text.get_height()//2+200))
-		pygame.draw.rect(screen, (235,106,234), (WIDTH//2-text.get_width()//2, HEIGHT//2-text.get_height()//2+200, 500, 400), 2)
+		self.player = Player(clock=clock, scale=self.scale)
+		self.entities = list()
+		# reusable entities per type, despawned entities go back to their pool
+		self.pools = {"ball": pool.Pool(Ball, capacity), "alien": pool.Pool(Alien, capacity), "cactus": pool.Pool(Cactus, capacity)}
+		self.grid = collision.SpatialHash(collision.cell_size_for(FIELDSIZE, BALL_SIZE))
+		self.spawner = spawner.SpawnScheduler(schedule)
+		self.reset()
 
-		pygame.display.update()
-		TPSCLOCK.tick(TPS)
-	pygame.mixer.music.stop()
-	pygame.mixer.music.unload()
-	runGame()
-
-def runGame():
-	screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.WINDOWMAXIMIZED)
-
-	pygame.mixer.music.load("./assets/sfx/music.ogg")
-	pygame.mixer.music.set_volume(MUSIC_VOLUME*0.5)
-	pygame.mixer.music.play(loops=-1)
-
-	### Game start
-	# Load player image
-	player = Player()
-	# set player to middle of map
-	player.setPos(FIELDSIZE[0]//2, player.map_field[1]+player.map_field[3]-player._height+player._hitboxOffset)
-	player.isJumping = True # Jumps at the beginning
-	time = pygame.time.get_ticks() # time since game started
-	last_spawned = pygame.time.get_ticks() # last time an entity spawned
-	spawn_cycles = 1 # how many times a mob has spawned
-	entities = list()
-
-	def spawn(entity_dict:dict):
-		for entity, count in entity_dict.items():
-			if entity == "ball":
-				entity = Ball(*get_random_coords(), direction=(-1**random.randint(1, 2), -1))
-			elif entity == "alien":
-				entity = Alien()
-			elif entity == "cactus":
-				entity = Cactus()
+	# Start a new game in place, the player, pools and entity store are reused
+	# clock, rng: replace the time source and random numbers (e.g. a fresh TickClock and a seeded
+	# random.Random make the new round play exactly like a new Game)
+	def reset(self, clock=None, rng=None) -> None:
+		if clock is not None:
+			self.clock = self.player._clock = clock
+		if rng is not None:
+			self.rng = rng
+			if self.store:
+				self.store.rng = rng
+		for entity in self.entities:
+			entity.alive = False
+		self.despawn()
+		self.ticks = 0		# simulation ticks since the game started
+		# set player to middle of map
+		self.player.reset()
+		self.player.setPos(FIELDSIZE[0]//2, self.player.map_field[1]+self.player.map_field[3]-self.player._height+self.player._hitboxOffset)
+		self.player.isJumping = True # Jumps at the beginning
+		self.start = self.clock.get_ticks() # time since game started
+		self.spawner.reset(self.start)
+		self.reach = 0.0	# farthest an entity moves along one axis in a tick (swept collision broadphase)
+		self.spawn({"ball":1})
+
+	def spawn(self, entity_dict:dict) -> None:
+		for kind, count in entity_dict.items():
+			self.spawn_group(kind, count)
+
+	# Spawn `count` entities of one kind at once (lane and velocity as in spawner.Wave)
+	def spawn_group(self, kind:str, count:int=1, lane:int=None, velocity:float=None) -> None:
+		entity_pool = self.pools.get(kind)
+		if entity_pool is None:
+			return
+		options = {"scale": self.scale}
+		if velocity is not None:
+			options["velocity"] = velocity
+		if kind != "ball":
+			options.update(rng=self.rng, lane=lane)
+		if self.store:
+			# grow the store's arrays once for the whole group
+			self.store.reserve(self.store.count+count)
+		group = list()
+		for _ in range(count):
+			if kind == "ball":
+				entity = entity_pool.acquire(*get_random_coords(self.rng), direction=(-1**self.rng.randint(1, 2), -1), **options)
 			else:
+				entity = entity_pool.acquire(**options)
+			if entity is None:
+				# pool exhausted, the spawn is dropped (and counted in the pool's refused)
+				warnings.warn(f"{kind} pool exhausted ({entity_pool.capacity} alive), spawns are dropped", RuntimeWarning, stacklevel=2)
 				continue
-			for _ in range(count):
-				entities.append(entity)
-
-	spawn({"ball":1})
-	background_img = pygame.image.load("assets/background.jpg")
-	# main loop
-	running = True
-	while running:
-		if GAME_END:
-			running = False
-			continue
-		# event handling, gets all event from the event queue
-		for event in pygame.event.get():
-			# only do something if the event is of type QUIT
-			if event.type == pygame.QUIT:
-				# change the value to False, to exit the main loop
-				running = False
-		# renderings
-		screen.fill((0, 0, 0))
-		screen.blit(background_img, (0,0))
-		# fill the min and max positions
-		rect_surface = pygame.Surface((maxPos[0]-minPos[0], maxPos[1]-minPos[1]))
-		rect_surface.fill((255,235,254, 128))
-		# draw outline
-		pygame.draw.rect(rect_surface, (0, 0, 0), rect_surface.get_rect(), 2)
-		screen.blit(rect_surface, minPos)
-		input = pygame.key.get_pressed()
+			if self.store:
+				if kind == "ball":
+					self.store.add(entity, entitystore.BALL, 20)
+				else:
+					self.store.add(entity, entitystore.ALIEN, entity._hitboxOffset)
+			group.append(entity)
+		self.entities.extend(group)
+		if group:
+			self.reach = max(self.reach, group[0].step)
+
+	# Remove entities that left the game and give them back to their pool
+	def despawn(self) -> None:
+		gone = [entity for entity in self.entities if not entity.alive]
+		if not gone:
+			return
+		self.entities = [entity for entity in self.entities if entity.alive]
+		for entity in gone:
+			if entity.stored:
+				self.store.remove(entity)
+			self.pools[entity.kind].release(entity)
+
+	# Advance the game by one tick, keys is anything indexable by pygame key constants
+	def update(self, keys) -> None:
+		player = self.player
+		profile = self.profiler
+		if profile:
+			profile.lap("sim")
+		if self.interpolate or CONTINUOUS_COLLISION:
+			self.snapshot()
+		now = self.clock.get_ticks()
 		player.vel_x = 0
 		player.vel_y = 0
-		if pygame.time.get_ticks() - player.last_damaged >= 1000:
+		if now - player.last_damaged >= 1000:
 			player.update_darkness(255)
-		if input[pygame.K_f]:
+		if keys[pygame.K_f]:
 			if player.flight_stamina != 0:
 				player.toggleFlight()
-		if input[pygame.K_w]:
+		if keys[pygame.K_w]:
 			if not player.isFlying and not player.isJumping:
 				player.jump()
 			else:
 				player.vel_y = -player.step
-		if input[pygame.K_a]:
+		if keys[pygame.K_a]:
 			player.vel_x = -player.step
-		if input[pygame.K_d]:
+		if keys[pygame.K_d]:
 			player.vel_x = player.step
-		if input[pygame.K_s]:
+		if keys[pygame.K_s]:
 			if player.isFlying:
 				player.vel_y = player.step
+		if profile:
+			profile.lap("input")
 
-		if input[pygame.K_ESCAPE]:
-			quit()
-
-		for entity in entities:
-			entity.move(screen=screen)
-			screen.blit(entity.image, (entity.x, entity.y))
-			if pygame.Rect.colliderect(pygame.Rect(*player.hitbox), pygame.Rect(*entity.hitbox)):
-				player.hit()
-			entity.refreshHitbox(screen=screen, color=(255, 0, 255), offset=entity._hitboxOffset)
+		if self.store:
+			self.store.step()
+		else:
+			for entity in self.entities:
+				entity.move()
+		if ALIEN_PASSES is not None:
+			self.despawn()
+		if not CONTINUOUS_COLLISION:
+			self.collide()
+		if profile:
+			profile.lap("move_entities")
 		##Player movement
-		player.move(screen=screen)
-		image_copy = player.image.copy()
-
-		# Darken the copy
-		image_copy.blit(player._dark_overlay, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-
-		# Draw the darkened image
-		screen.blit(image_copy, (player.x, player.y))
+		player.move()
+		if CONTINUOUS_COLLISION:
+			# once the player moved too, both movements of this tick are swept
+			self.collide()
 
 		# Track player's flight time
 		if player.isFlying:
 			# Check if 1 second has passed
-			if pygame.time.get_ticks() - player.lastStaminaRegen >= 1000:
+			if self.clock.get_ticks() - player.lastStaminaRegen >= 1000:
 				if player.flight_stamina >= 1:
 					player.flight_stamina-=1
 				else:
 					player.toggleFlight()
-				player.lastStaminaRegen = pygame.time.get_ticks()
+				player.lastStaminaRegen = self.clock.get_ticks()
 		else:
 			# Check if 2 seconds have passed
-			if pygame.time.get_ticks() - player.lastStaminaRegen >= 2000:  
+			if self.clock.get_ticks() - player.lastStaminaRegen >= 2000:  
 				if player.flight_stamina < player.max_flight_time:  # Don't exceed max flight time
 					player.flight_stamina += 1  # Regenerate stamina
-				player.lastStaminaRegen = pygame.time.get_ticks()  # Update last stamina regeneration time
-		# rect_surface as a rect
-		if SHOW_HITBOXES:
-			drawCorners(screen)
-			# pygame.draw.rect(screen, (255, 0, 0), player.map_field, 2)
-		
-		# display time
-		font = pygame.font.Font(None, 36)
-		text = font.render(f"{float(pygame.time.get_ticks() - time)/1000}s", True, (0,0,0))
-		screen.blit(text, (WIDTH//2-text.get_width()//2, 20))
-
-		# Entity spawning
-		if pygame.time.get_ticks() - last_spawned >= 5000*(spawn_cycles):
-			last_spawned = pygame.time.get_ticks()
-			if spawn_cycles%2==0:
-				spawn({"cactus":1})
-			elif spawn_cycles%5==0:
-				spawn({"ball":1})
-			else:
-				spawn({"alien":1})
-			spawn_cycles+=1
-		pygame.display.update()
-		TPSCLOCK.tick(TPS)
-	# game over screen
-	# play gameover sfx
-	pygame.mixer.music.stop()
-	pygame.mixer.music.unload()
-	pygame.mixer.music.load("./assets/sfx/gameover.ogg")
-	pygame.mixer.music.set_volume(MUSIC_VOLUME)
-	pygame.mixer.music.play()
+				player.lastStaminaRegen = self.clock.get_ticks()  # Update last stamina regeneration time
+		if profile:
+			profile.lap("move_player")
+
+		# Entity spawning (only the waves that are due leave the scheduler's queue)
+		for wave in self.spawner.due(self.clock.get_ticks()):
+			self.spawn_group(wave.kind, wave.count, wave.lane, wave.velocity)
+		self.ticks += 1
+		if profile:
+			profile.lap("spawn")
+
+	# Remember all positions as the start of the next tick
+	def snapshot(self) -> None:
+		self.player.snapshot()
+		if self.store:
+			self.store.snapshot()
+		else:
+			for entity in self.entities:
+				entity.snapshot()
+
+	# Check the player against every entity (one C-level pass over the persistent hitboxes, with
+	# pixel collision the sprite masks of the few overlapping entities decide)
+	def collide(self) -> None:
+		player = self.player
+		if not player.vulnerable:
+			return
+		if CONTINUOUS_COLLISION:
+			self.collide_swept()
+			return
+		if not self.pixel_collision:
+			if self.store:
+				if self.store.collides(player.hitbox):
+					player.hit()
+			elif player.hitbox.collidelist([entity.hitbox for entity in self.entities]) != -1:
+				player.hit()
+			return
+		if self.store:
+			candidates = self.store.overlapping(player.hitbox)
+		else:
+			hitboxes = [entity.hitbox for entity in self.entities]
+			# usually nothing overlaps, the early-out pass settles that
+			if player.hitbox.collidelist(hitboxes) == -1:
+				return
+			candidates = [self.entities[index] for index in player.hitbox.collidelistall(hitboxes)]
+		for entity in candidates:
+			if player.touches(entity):
+				player.hit()
+				break
+
+	# Continuous collision: every hitbox is swept from its position at the start of the tick (relative
+	# to the player's own movement), so fast entities and low tick rates can't skip a hit
+	def collide_swept(self) -> None:
+		player = self.player
+		pdx, pdy = player.moved
+		box = player.hitbox
+		start = (box[0]-pdx, box[1]-pdy, box[2], box[3])
+		if self.store:
+			hits = self.store.sweeping(start, pdx, pdy)
+		else:
+			# entities further away than they move in a tick can't reach the player
+			reach = math.ceil(self.reach)+1
+			area = box.union(pygame.Rect(start)).inflate(2*reach, 2*reach)
+			hits = list()
+			for index in area.collidelistall([entity.hitbox for entity in self.entities]):
+				entity = self.entities[index]
+				dx, dy = entity.moved
+				hitbox = entity.hitbox
+				hit = collision.sweep((hitbox[0]-dx, hitbox[1]-dy, hitbox[2], hitbox[3]), dx-pdx, dy-pdy, start)
+				if hit:
+					hits.append((entity, *hit))
+		for entity, enter, leave in hits:
+			if not self.pixel_collision or self.touches_between(entity, enter, leave):
+				player.hit()
+				break
+
+	# Do the sprites of the player and an entity touch between the times enter and leave (0-1) of
+	# this tick, the masks are compared every SWEEP_STEP pixels of the relative movement
+	def touches_between(self, entity, enter:float, leave:float) -> bool:
+		player = self.player
+		(pdx, pdy), (dx, dy) = player.moved, entity.moved
+		steps = max(1, math.ceil(max(abs(dx-pdx), abs(dy-pdy))*(leave-enter)/SWEEP_STEP))
+		for step in range(steps+1):
+			back = 1-(enter+(leave-enter)*step/steps)	# share of the tick still ahead
+			offset = (int(entity.x-dx*back)-int(player.x-pdx*back), int(entity.y-dy*back)-int(player.y-pdy*back))
+			if player.touches(entity, offset):
+				return True
+		return False
+
+	# Entities overlapping a rect (spatial hash broadphase)
+	def entities_at(self, rect) -> list:
+		self.grid.build(self.entities)
+		return self.grid.query(rect)
+
+	# Overlapping entity pairs (spatial hash broadphase)
+	def entity_collisions(self) -> list:
+		self.grid.build(self.entities)
+		return self.grid.pairs()
+
+	# Snapshot of the game state (e.g. for headless runs)
+	def state(self) -> dict:
+		return {
+			"ticks": self.ticks,
+			"elapsed": self.elapsed,
+			"over": self.over,
+			"hp": self.player.hp,
+			"flight_stamina": self.player.flight_stamina,
+			# floats on both paths (entity store views are numpy floats, objects mix ints and floats),
+			# so the digest of a state doesn't depend on the path
+			"player": (float(self.player.x), float(self.player.y)),
+			"entities": [(type(entity).__name__, float(entity.x), float(entity.y)) for entity in self.entities],
+			"spawn_cycles": self.spawn_cycles,
+		}
+
+	elapsed = property(lambda self: self.clock.get_ticks() - self.start)
+	spawn_cycles = property(lambda self: self.spawner.cycles)	# next cycle of the classic spawns
+	over = property(lambda self: self.player.hp <= 0)
+
+# Draw the parts of a frame that never change (background and playfield)
+def draw_static(screen, background_img) -> None:
 	screen.fill((0, 0, 0))
-	# game over text
-	font = pygame.font.Font(None, 74)
-	text = font.render("Game Over", True, (255, 255, 255))
-	textRect = text.get_rect()
-	textRect.center = (WIDTH // 2, HEIGHT // 2)
-	screen.blit(text, textRect)
-	# time the player survived
-	time_survived = pygame.time.get_ticks() - time
-	# time survived text
-	font = pygame.font.Font(None, 48)
-	text = font.render(f"You survived for {time_survived//1000} seconds", True, (255, 255, 255))
-	textRect = text.get_rect()
-	textRect.center = (WIDTH // 2, HEIGHT // 2 + 50)
-	screen.blit(text, textRect)
-	# player is below the text
-	white_overlay = pygame.Surface((player.image.get_width(), player.image.get_height()), pygame.SRCALPHA)
-	white_overlay.fill((255, 255, 255, 128))
-	# draw white player
-	player_img = player.image.copy()
-	player_img.blit(white_overlay, (0,0), special_flags=pygame.BLEND_RGBA_MULT)
-	screen.blit(player_img, (WIDTH//2-PLAYER_SIZE//2, HEIGHT//2+100))
-	# make copy of player that is completely white
-	pygame.display.update()
-	pygame.time.wait(5000)
+	screen.blit(background_img, (0,0))
+	# fill the min and max positions
+	rect_surface = pygame.Surface((maxPos[0]-minPos[0], maxPos[1]-minPos[1]))
+	rect_surface.fill((255,235,254, 128))
+	# draw outline
+	pygame.draw.rect(rect_surface, (0, 0, 0), rect_surface.get_rect(), 2)
+	screen.blit(rect_surface, minPos)
+	# rect_surface as a rect
+	if SHOW_HITBOXES:
+		drawCorners(screen)
+		# pygame.draw.rect(screen, (255, 0, 0), player.map_field, 2)
+
+# Debug outlines (hitbox, color) of the entities, entities overlapping another entity (found by the
+# spatial hash broadphase) are yellow
+def entity_outlines(game:Game) -> list:
+	overlapping = {id(entity) for pair in game.entity_collisions() for entity in pair}
+	return [(entity.hitbox, (255, 255, 0) if id(entity) in overlapping else (255, 0, 255)) for entity in game.entities]
+
+# Draw everything that moves (sprites, health bars, HUD), returns the changed areas
+# The sprites are queued by layer and drawn with one Surface.blits() per layer, debug hitboxes on top.
+# alpha: position between the previous and the current tick (None draws the current positions)
+# overlays: extra (surface, position) pairs drawn on top (e.g. the profiler overlay)
+# queue: renderqueue.RenderQueue to reuse (a new one when None)
+def draw_dynamic(screen, game:Game, alpha:float=None, overlays:tuple=(), queue:renderqueue.RenderQueue=None) -> list:
+	player = game.player
+	profile = game.profiler
+	if queue is None:
+		queue = renderqueue.RenderQueue()
+	if profile:
+		profile.lap("background")
+	add = queue.add
+	if alpha is None:
+		for entity in game.entities:
+			add(entity.image, (entity.x, entity.y), entity.layer)
+	else:
+		for entity in game.entities:
+			add(entity.image, entity.lerp(alpha), entity.layer)
+	if SHOW_HITBOXES:
+		for hitbox, color in entity_outlines(game):
+			queue.rect(hitbox, color, HITBOX_WIDTH)
+	if profile:
+		profile.lap("draw_entities")
+	player_pos = player.lerp(alpha) if alpha is not None else (player.x, player.y)
+	add(player.healthbar, (player_pos[0], player_pos[1]-20), player.layer)	# 20 pixels above the player
+	# Draw the darkened image
+	add(player.tinted_image, player_pos, player.layer)
+	if SHOW_HITBOXES:
+		queue.rect(player.hitbox, (0, 255, 0), HITBOX_WIDTH)
+	if profile:
+		profile.lap("draw_player")
+
+	# display time
+	queue.extend(hud.glyph_blits(f"{float(game.elapsed)/1000}s", 36, (0,0,0), WIDTH//2, 20)[0], LAYER_HUD)
+	queue.extend(overlays, LAYER_HUD)
+	if profile:
+		profile.lap("hud")
+	dirty = queue.submit(screen)
+	if profile:
+		profile.lap("blits")
+	return dirty
+
+# Draw one frame of the game world
+def draw(screen, game:Game, background_img) -> None:
+	draw_static(screen, background_img)
+	draw_dynamic(screen, game)
+
+# Renders every frame completely, the static layer is composed once and cached
+class Renderer():
+	def __init__(self, screen, background_img):
+		self._screen = screen
+		self._background_img = background_img
+		self._static = None
+		self._queue = renderqueue.RenderQueue()	# reused every frame
+
+	# Background and playfield, composed once
+	def static_layer(self) -> pygame.Surface:
+		if self._static is None:
+			self._static = pygame.Surface(self._screen.get_size()).convert()
+			draw_static(self._static, self._background_img)
+		return self._static
+
+	# Force a full redraw on the next frame (e.g. the window was exposed or SHOW_HITBOXES toggled)
+	def invalidate(self) -> None:
+		self._static = None
+
+	def draw(self, game:Game, alpha:float=None, overlays:tuple=()) -> None:
+		self._screen.blit(self.static_layer(), (0, 0))
+		draw_dynamic(self._screen, game, alpha, overlays, self._queue)
+
+	def present(self) -> None:
+		pygame.display.update()
+
+# Only restores and pushes the areas that changed since the last frame
+class DirtyRenderer(Renderer):
+	# With more dirty rects than this a full redraw is cheaper
+	MAX_RECTS = 200
+
+	def __init__(self, screen, background_img):
+		super().__init__(screen, background_img)
+		self._previous = list()	# areas drawn last frame, restored from the static layer
+		self._dirty = None		# areas to push this frame, None = whole screen
+
+	def invalidate(self) -> None:
+		super().invalidate()
+		self._previous = list()
+
+	def draw(self, game:Game, alpha:float=None, overlays:tuple=()) -> None:
+		full = self._static is None or len(self._previous) > self.MAX_RECTS
+		static = self.static_layer()
+		if full:
+			self._screen.blit(static, (0, 0))
+		else:
+			self._screen.blits([(static, rect, rect) for rect in self._previous], doreturn=False)
+		current = draw_dynamic(self._screen, game, alpha, overlays, self._queue)
+		self._dirty = None if full else self._previous+current
+		self._previous = current
+
+	def present(self) -> None:
+		if self._dirty is None:
+			pygame.display.update()
+		else:
+			pygame.display.update(self._dirty)
+
+# Draws the game world into an internal surface of its own resolution (game coordinates scaled
+# to it) and upscales that to the window in one pass, the HUD is drawn on top at window resolution
+class ScaledRenderer(Renderer):
+	def __init__(self, screen, background_img, resolution:tuple):
+		super().__init__(screen, background_img)
+		self._scale = min(resolution[0]/WIDTH, resolution[1]/HEIGHT)
+		# the world fitted into the resolution (a resolution of another aspect ratio is shrunk to 16:9)
+		self._target = pygame.Surface((max(1, round(WIDTH*self._scale)), max(1, round(HEIGHT*self._scale)))).convert()
+
+	def static_layer(self) -> pygame.Surface:
+		if self._static is None:
+			full = pygame.Surface((WIDTH, HEIGHT)).convert()
+			draw_static(full, self._background_img)
+			self._static = pygame.transform.smoothscale(full, self._target.get_size())
+		return self._static
+
+	# Copy of a sprite at the internal resolution (cached)
+	def _sprite(self, image:pygame.Surface) -> pygame.Surface:
+		if self._scale == 1:
+			return image
+		width, height = image.get_size()
+		return resources.scaled(image, (max(1, round(width*self._scale)), max(1, round(height*self._scale))))
+
+	# Queue a debug hitbox outline at the internal resolution
+	def _outline(self, hitbox:pygame.Rect, color:tuple) -> None:
+		scale = self._scale
+		self._queue.rect(pygame.Rect(round(hitbox.x*scale), round(hitbox.y*scale), round(hitbox.width*scale), round(hitbox.height*scale)), color, max(1, round(HITBOX_WIDTH*scale)))
+
+	def draw(self, game:Game, alpha:float=None, overlays:tuple=()) -> None:
+		target, scale, player = self._target, self._scale, game.player
+		profile = game.profiler
+		target.blit(self.static_layer(), (0, 0))
+		if profile:
+			profile.lap("background")
+		queue = self._queue
+		for entity in game.entities:
+			(x, y) = entity.lerp(alpha) if alpha is not None else (entity.x, entity.y)
+			queue.add(self._sprite(entity.image), (x*scale, y*scale), entity.layer)
+		if SHOW_HITBOXES:
+			for hitbox, color in entity_outlines(game):
+				self._outline(hitbox, color)
+		if profile:
+			profile.lap("draw_entities")
+		(x, y) = player.lerp(alpha) if alpha is not None else (player.x, player.y)
+		queue.add(self._sprite(player.tinted_image), (x*scale, y*scale), player.layer)
+		if SHOW_HITBOXES:
+			self._outline(player.hitbox, (0, 255, 0))
+		if profile:
+			profile.lap("draw_player")
+		queue.submit(target, doreturn=False)
+		if profile:
+			profile.lap("blits")
+
+		# single upscale pass
+		pygame.transform.scale(target, self._screen.get_size(), self._screen)
+		if profile:
+			profile.lap("upscale")
+
+		# HUD at window resolution
+		self._screen.blit(player.healthbar, (x, y-20))
+		hud.draw_glyphs(self._screen, f"{float(game.elapsed)/1000}s", 36, (0,0,0), WIDTH//2, 20)
+		for surface, position in overlays:
+			self._screen.blit(surface, position)
+		if profile:
+			profile.lap("hud")
+
+	def present(self) -> None:
+		pygame.display.flip()
+
+# Draws with SDL's renderer (gpu.TextureDisplay): sprites, background and HUD glyphs are textures
+# uploaded once, the player's tint is a texture color modulation instead of a blended copy
+class TextureRenderer(Renderer):
+	def __init__(self, display:gpu.TextureDisplay, background_img):
+		super().__init__(display.screen, background_img)
+		self._display = display
+		self._bars = None	# values shown by the uploaded health bar texture
+
+	def static_layer(self) -> pygame.Surface:
+		if self._static is None:
+			# kept as a surface, the display caches its texture as long as it lives
+			self._static = pygame.Surface((WIDTH, HEIGHT))
+			draw_static(self._static, self._background_img)
+		return self._static
+
+	def draw(self, game:Game, alpha:float=None, overlays:tuple=()) -> None:
+		display, player, queue = self._display, game.player, self._queue
+		profile = game.profiler
+		display.fill((0, 0, 0))
+		display.blits(((self.static_layer(), (0, 0)),))
+		if profile:
+			profile.lap("background")
+		add = queue.add
+		for entity in game.entities:
+			add(entity.image, entity.lerp(alpha) if alpha is not None else (entity.x, entity.y), entity.layer)
+		if profile:
+			profile.lap("draw_entities")
+		(x, y) = player.lerp(alpha) if alpha is not None else (player.x, player.y)
+		bars = player.healthbar
+		# the bars are redrawn in place when the values change, upload them again
+		values = (player.hp, player.max_hp, player.flight_stamina, player.max_flight_time)
+		if values != self._bars:
+			self._bars = values
+			display.refresh(bars)
+		add(bars, (x, y-20), player.layer)
+		add(display.tinted(player.image, player.tint), (x, y), player.layer)
+		if profile:
+			profile.lap("draw_player")
+		queue.extend(hud.glyph_blits(f"{float(game.elapsed)/1000}s", 36, (0,0,0), WIDTH//2, 20)[0], LAYER_HUD)
+		queue.extend(overlays, LAYER_HUD)
+		queue.submit(display, doreturn=False)
+		if SHOW_HITBOXES:
+			for hitbox, color in entity_outlines(game):
+				display.rects((hitbox,), color, HITBOX_WIDTH)
+			display.rects([player.hitbox], (0, 255, 0), HITBOX_WIDTH)
+		if profile:
+			profile.lap("blits")
+
+	def present(self) -> None:
+		self._display.present()
+
+# Renderer for the settings: textures on a gpu.TextureDisplay, scaled with a RENDER_RESOLUTION,
+# else dirty rects or full redraws
+def make_renderer(screen, background_img, display:gpu.TextureDisplay=None) -> Renderer:
+	if display is not None:
+		return TextureRenderer(display, background_img)
+	if RENDER_RESOLUTION:
+		return ScaledRenderer(screen, background_img, RENDER_RESOLUTION)
+	return (DirtyRenderer if DIRTY_RECTS else Renderer)(screen, background_img)
+
+# Initialize pygame on SDL's dummy drivers (no window, no sound card needed)
+def headless() -> None:
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+	pygame.init()
+
+# Run the game logic without rendering, as fast as the CPU allows
+# inputs: optional function tick -> keys, clock defaults to a TickClock, returns the final Game
+def simulate(ticks:int, seed=None, inputs=None, clock=None, store:bool=False, tps:int=TPS, schedule:spawner.Schedule=CLASSIC_SCHEDULE) -> Game:
+	headless()
+	game = Game(clock=clock or TickClock(tps), rng=random.Random(seed), store=store, tps=tps, schedule=schedule)
+	for tick in range(ticks):
+		if game.over:
+			break
+		game.update(inputs(tick) if inputs else NO_INPUT)
+		game.clock.tick(tps)
+	return game
+
+# Start decoding every gameplay asset on the loader's threads
+def preload_assets(assets:loader.AssetLoader) -> loader.AssetLoader:
+	for path in (GAME_MUSIC, GAME_OVER_MUSIC):
+		assets.submit(path, resources.music, path)
+	for key in BUNDLE_IMAGES:
+		assets.submit(key.path, resources.preload, key)
+	for path in (JUMP_SOUND, HIT_SOUND):
+		assets.submit(path, resources.sound, path)
+	return assets
+
+# Spawn schedule of a waves file (the classic one for None)
+def load_schedule(path:str=None) -> spawner.Schedule:
+	return spawner.load(path) if path else CLASSIC_SCHEDULE
+
+# Module switches that change how a round plays out, recorded in replays
+def simulation_switches() -> dict:
+	return {"pixel_collision": PIXEL_COLLISION, "continuous_collision": CONTINUOUS_COLLISION, "alien_passes": ALIEN_PASSES}
+
+# Set the simulation switches (missing ones go back to their defaults)
+def apply_switches(switches:dict) -> None:
+	global PIXEL_COLLISION, CONTINUOUS_COLLISION, ALIEN_PASSES
+	PIXEL_COLLISION = switches.get("pixel_collision", True)
+	CONTINUOUS_COLLISION = switches.get("continuous_collision", False)
+	ALIEN_PASSES = switches.get("alien_passes")
+
+# Re-run a recorded round without a window as fast as the CPU allows, returns the final Game
+# (with the recording's simulation switches, the current ones are restored afterwards)
+def replay_headless(recording:replay.Replay, store:bool=False) -> Game:
+	switches = simulation_switches()
+	apply_switches(recording.switches)
+	try:
+		return simulate(len(recording), seed=recording.seed, inputs=recording.inputs, store=store, tps=recording.tps, schedule=load_schedule(recording.waves))
+	finally:
+		apply_switches(switches)
+
+# playback: recorded round to show instead of the game (at speed times real time)
+def main(playback:replay.Replay=None, speed:float=1.0):
+	pygame.init()
+	atlas.load(BUNDLE_FILE)
+	logo = resources.image(LOGO_IMAGE)
+	# the window is created once, scenes only draw into it
+	if TEXTURE_RENDERER:
+		display = gpu.TextureDisplay((WIDTH, HEIGHT), "murimuri adventures", resizable=True, maximized=True)
+		display.window.set_icon(logo)
+		manager = scene.SceneManager(display.screen, display=display)
+	else:
+		pygame.display.set_icon(logo)
+		pygame.display.set_caption("murimuri adventures")
+		manager = scene.SceneManager(pygame.display.set_mode((WIDTH, HEIGHT), pygame.WINDOWMAXIMIZED))
+	# Gameplay assets load in the background while the title screen is shown
+	assets = preload_assets(loader.AssetLoader())
+	manager.add("title", TitleScene(manager, assets))
+	manager.add("play", PlayScene(manager, assets))
+	manager.add("game_over", GameOverScene(manager))
+	if playback:
+		manager.add("replay", ReplayScene(manager, assets, playback, speed))
+	manager.run("replay" if playback else "title")
+	assets.shutdown()
+	pygame.quit()
+
+class TitleScene(scene.Scene):
+	def __init__(self, manager, assets:loader.AssetLoader):
+		super().__init__(manager)
+		self.assets = assets
+		self.logo = resources.image(LOGO_IMAGE)
+		# Textbox (static, rendered once)
+		string = '''
+Controls:
+- Use WASD controls to move
+- Press [F] to toggle Flightmode\n
+Gameplay:
+Survive for as long as you can!
+You can only fly for a limited time\n
+* Press the W key to start! *'''
+		rect = pygame.Rect((0, 0, 500, 400))
+		self.text = Textrect.render_textrect(string, hud.font(45), rect, (0,0,0), (255,255,255), 1)
+
+	def enter(self) -> None:
+		# Load song (the title track is optional)
+		try:
+			pygame.mixer.music.load(TITLE_MUSIC)
+			pygame.mixer.music.set_volume(MUSIC_VOLUME)
+			pygame.mixer.music.play(loops=-1)
+		except pygame.error:
+			pass
+
+	def exit(self) -> None:
+		pygame.mixer.music.stop()
+		pygame.mixer.music.unload()
+
+	def frame(self, events:list):
+		screen, logo, text, assets = self.manager.screen, self.logo, self.text, self.assets
+		for event in events:
+			if event.type == pygame.KEYDOWN and event.key == pygame.K_w:
+				return self.manager.scenes["play"]
+		### Main Menu
+		screen.fill(PRIMARY_COLOR)
+		screen.blit(logo, (WIDTH//2-logo.get_width()//2, HEIGHT//2-logo.get_height()//2-200))
+
+		# Draw Textbox
+		screen.blit(text, (WIDTH//2-text.get_width()//2, HEIGHT//2-text.get_height()//2+200))
+		pygame.draw.rect(screen, (235,106,234), (WIDTH//2-text.get_width()//2, HEIGHT//2-text.get_height()//2+200, 500, 400), 2)
+
+		# Loading progress
+		if not assets.done:
+			loaded, total = assets.progress
+			progress = hud.text(f"Loading {loaded}/{total}", 30, (0,0,0))
+			screen.blit(progress, (WIDTH//2-progress.get_width()//2, HEIGHT-50))
+
+		self.manager.present()
+		self.manager.clock.tick(TPS)
+		return self
+
+class PlayScene(scene.Scene):
+	speed = 1.0		# game time per real time
+
+	def __init__(self, manager, assets:loader.AssetLoader):
+		super().__init__(manager)
+		self.assets = assets
+		self.tps = TPS
+		self.waves = WAVES_FILE
+		self.game = None	# built on the first enter, reset in place for every further round
+		self.renderer = None
+		self.recording = None	# replay.Replay of the current round (only with RECORD_FILE)
+
+	# Clock and RNG of a new round (seeded, so the round can be recorded)
+	def new_round(self) -> tuple:
+		seed = random.getrandbits(32)
+		if RECORD_FILE:
+			self.recording = replay.Replay(seed, self.tps, waves=self.waves, switches=simulation_switches())
+		return TickClock(self.tps), random.Random(seed)
+
+	# Keys of the next simulation tick
+	def keys(self, pressed):
+		if self.recording is not None:
+			self.recording.record(pressed)
+		return pressed
+
+	def done(self) -> bool:
+		return self.game.over
+
+	# Scene that follows once the round is done
+	def following(self):
+		return self.manager.scenes["game_over"]
+
+	def enter(self) -> None:
+		# only waits for the assets that are not loaded yet
+		self.assets.wait()
+		pygame.mixer.music.load(resources.music(GAME_MUSIC), "ogg")
+		pygame.mixer.music.set_volume(MUSIC_VOLUME*0.5)
+		pygame.mixer.music.play(loops=-1)
+
+		### Game start
+		clock, rng = self.new_round()
+		if self.game is None:
+			# game time only advances with simulation ticks, so long frames never change the game speed
+			self.game = Game(clock=clock, rng=rng, tps=self.tps, schedule=load_schedule(self.waves))
+			self.game.interpolate = INTERPOLATE
+			self.renderer = make_renderer(self.manager.screen, resources.image(BACKGROUND_IMAGE), self.manager.display)
+			# frame profiler (F3 toggles the overlay, F4 writes a trace)
+			if PROFILE or TRACE_FILE:
+				self.game.profiler = profiler.FrameProfiler(trace_frames=TRACE_FRAMES)
+			self.show_profile = PROFILE
+		else:
+			self.game.reset(clock=clock, rng=rng)
+		self.renderer.invalidate()
+		self.overlays = ()
+		self.overlay_time = 0.0
+		self.accumulator = 0.0
+		self.last_frame = time.perf_counter()
+
+	def exit(self) -> None:
+		if self.game.profiler and TRACE_FILE:
+			self.game.profiler.dump_trace(TRACE_FILE)
+		if self.recording is not None:
+			self.recording.state = replay.digest(self.game.state())
+			self.recording.save(RECORD_FILE)
+		pygame.mixer.music.stop()
+		pygame.mixer.music.unload()
+
+	def frame(self, events:list):
+		game, renderer = self.game, self.renderer
+		tick_length = 1/self.tps
+		profile = game.profiler
+		if profile:
+			profile.begin_frame()
+		# event handling
+		for event in events:
+			if event.type == pygame.WINDOWEXPOSED:
+				renderer.invalidate()
+			elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+				self.show_profile = not self.show_profile
+				if not game.profiler:
+					game.profiler = profiler.FrameProfiler(trace_frames=TRACE_FRAMES)
+					# the rest of this frame is timed from here (it is booked from the next frame on)
+					game.profiler.begin_frame()
+				self.overlays = ()
+			elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4 and game.profiler:
+				game.profiler.dump_trace(TRACE_FILE or "trace.json")
+		if profile:
+			profile.lap("events")
+		input = pygame.key.get_pressed()
+		if input[pygame.K_ESCAPE]:
+			return None
+
+		# run as many fixed simulation ticks as the time since the last frame covers
+		now = time.perf_counter()
+		self.accumulator += min(now-self.last_frame, MAX_FRAME_TIME)*self.speed
+		self.last_frame = now
+		while self.accumulator >= tick_length and not self.done():
+			game.update(self.keys(input))
+			game.clock.tick(self.tps)
+			self.accumulator -= tick_length
+		# renderings
+		if profile and self.show_profile and (not self.overlays or now-self.overlay_time >= 0.5):
+			self.overlays = ((hud.text_panel(profile.report(), 20, (255, 255, 255), (0, 0, 0, 160)), (10, 10)),)
+			self.overlay_time = now
+		renderer.draw(game, self.accumulator/tick_length if INTERPOLATE else None, self.overlays if self.show_profile else ())
+		renderer.present()
+		if profile:
+			profile.lap("present")
+		self.manager.clock.tick(FPS)
+		if profile:
+			profile.lap("idle")
+			profile.end_frame()
+		return self.following() if self.done() else self
+
+# Rendered playback of a recorded round at any speed (ESC stops it)
+class ReplayScene(PlayScene):
+	def __init__(self, manager, assets:loader.AssetLoader, recording:replay.Replay, speed:float=1.0):
+		super().__init__(manager, assets)
+		self.playback = recording
+		self.tps = recording.tps
+		self.waves = recording.waves
+		self.speed = speed
+		apply_switches(recording.switches)	# the game of this process only plays the recording
+
+	def new_round(self) -> tuple:
+		return TickClock(self.tps), random.Random(self.playback.seed)
+
+	def keys(self, pressed):
+		return self.playback.inputs(self.game.ticks)
+
+	def done(self) -> bool:
+		return self.game.over or self.game.ticks >= len(self.playback)
+
+	def following(self):
+		return None
+
+	def exit(self) -> None:
+		super().exit()
+		if self.done() and self.playback.state:
+			print("replay matches the recording" if replay.digest(self.game.state()) == self.playback.state else "replay diverged from the recording")
+
+class GameOverScene(scene.Scene):
+	RETRY_DELAY = 1000	# ms before W restarts (it is still held down from playing)
+	TIMEOUT = 10000		# ms until the title screen comes back
+
+	def enter(self) -> None:
+		screen, game = self.manager.screen, self.manager.scenes["play"].game
+		# play gameover sfx
+		pygame.mixer.music.load(resources.music(GAME_OVER_MUSIC), "ogg")
+		pygame.mixer.music.set_volume(MUSIC_VOLUME)
+		pygame.mixer.music.play()
+		screen.fill((0, 0, 0))
+		# game over text
+		text = hud.text("Game Over", 74, (255, 255, 255))
+		textRect = text.get_rect()
+		textRect.center = (WIDTH // 2, HEIGHT // 2)
+		screen.blit(text, textRect)
+		# time the player survived
+		time_survived = game.elapsed
+		# time survived text
+		text = hud.text(f"You survived for {time_survived//1000} seconds", 48, (255, 255, 255))
+		textRect = text.get_rect()
+		textRect.center = (WIDTH // 2, HEIGHT // 2 + 50)
+		screen.blit(text, textRect)
+		# player is below the text
+		# draw white player
+		screen.blit(resources.tint(game.player.image, GAME_OVER_TINT), (WIDTH//2-PLAYER_SIZE//2, HEIGHT//2+100))
+		text = hud.text("Press [W] to play again", 36, (255, 255, 255))
+		textRect = text.get_rect()
+		textRect.center = (WIDTH // 2, HEIGHT // 2 + 300)
+		screen.blit(text, textRect)
+		self.manager.present()
+		self.entered = pygame.time.get_ticks()
+
+	def exit(self) -> None:
+		pygame.mixer.music.stop()
+		pygame.mixer.music.unload()
+
+	def frame(self, events:list):
+		waited = pygame.time.get_ticks()-self.entered
+		self.manager.clock.tick(TPS)
+		for event in events:
+			if event.type == pygame.KEYDOWN and event.key == pygame.K_w and waited >= self.RETRY_DELAY:
+				return self.manager.scenes["play"]
+			if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+				return self.manager.scenes["title"]
+		if waited >= self.TIMEOUT:
+			return self.manager.scenes["title"]
+		return self
 
 if __name__=="__main__":
-	main()
+	parser = argparse.ArgumentParser(description="murimuri adventures")
+	parser.add_argument("--headless", type=int, metavar="TICKS", help="simulate TICKS ticks without a window and print the final state")
+	parser.add_argument("--seed", type=int, default=None, help="random seed for headless runs")
+	parser.add_argument("--store", action="store_true", help="move entities with the vectorized numpy entity store")
+	parser.add_argument("--waves", metavar="FILE", help="spawn schedule file (default: the classic spawns)")
+	parser.add_argument("--tps", type=int, default=TPS, help="simulation ticks per second (lower it on slow machines, best with --continuous)")
+	parser.add_argument("--passes", type=int, metavar="N", help="despawn aliens and cacti after N screen crossings instead of wrapping them forever")
+	parser.add_argument("--continuous", action="store_true", help="sweep hitboxes over each tick, no hit is missed at low tick rates or high speeds")
+	parser.add_argument("--gpu", action="store_true", help="draw with SDL's renderer and textures (falls back to SDL's software renderer)")
+	parser.add_argument("--resolution", type=lambda size: tuple(int(value) for value in size.split("x")), metavar="WxH", help="draw the game world at this resolution and upscale it to the window")
+	parser.add_argument("--profile", action="store_true", help="show the per-phase frame profiler overlay")
+	parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the last frames to FILE when the game ends")
+	parser.add_argument("--record", metavar="FILE", help="record the seed and keys of every round to FILE")
+	parser.add_argument("--replay", metavar="FILE", help="play a recorded round")
+	parser.add_argument("--speed", type=float, default=1.0, help="playback speed of --replay")
+	parser.add_argument("--fast", action="store_true", help="run --replay headless as fast as possible and check it against the recording")
+	args = parser.parse_args()
+	PROFILE, TRACE_FILE, RECORD_FILE, WAVES_FILE = args.profile, args.trace, args.record, args.waves
+	RENDER_RESOLUTION, TEXTURE_RENDERER = args.resolution, args.gpu
+	TPS, CONTINUOUS_COLLISION, ALIEN_PASSES = args.tps, args.continuous, args.passes
+	if args.replay and args.fast:
+		recording = replay.Replay.load(args.replay)
+		start = time.perf_counter()
+		game = replay_headless(recording, store=args.store)
+		seconds = time.perf_counter()-start
+		print(json.dumps({
+			"ticks": game.ticks,
+			"seconds": seconds,
+			"ticks_per_second": game.ticks/seconds if seconds else None,
+			"matches": replay.digest(game.state()) == recording.state if recording.state else None,
+			"state": game.state(),
+		}))
+	elif args.headless is not None:
+		print(json.dumps(simulate(args.headless, seed=args.seed, store=args.store, tps=TPS, schedule=load_schedule(WAVES_FILE)).state()))
+	else:
+		main(replay.Replay.load(args.replay) if args.replay else None, args.speed)
@@ -0,0 +1,31 @@
+# Pools of reusable objects, optionally capped
+# Released objects are kept and re-initialized with reset(...) instead of being rebuilt.
+
+class Pool():
+	# capacity: most objects handed out at the same time (None: unlimited)
+	def __init__(self, factory, capacity:int=None):
+		self._factory = factory	# builds a new object, called with the acquire arguments
+		self.capacity = capacity
+		self.active = 0			# objects handed out and not released yet
+		self.refused = 0		# acquires turned down because the pool was exhausted
+		self._free = list()
+
+	# Get an object (None when the pool is exhausted)
+	def acquire(self, *args, **kwargs):
+		if self.capacity is not None and self.active >= self.capacity:
+			self.refused += 1
+			return None
+		self.active += 1
+		if self._free:
+			item = self._free.pop()
+			item.reset(*args, **kwargs)
+			return item
+		return self._factory(*args, **kwargs)
+
+	# Give an object back for reuse
+	def release(self, item) -> None:
+		self.active -= 1
+		self._free.append(item)
+
+	# Released objects waiting for reuse
+	free = property(lambda self: len(self._free))
@@ -0,0 +1,61 @@
+# Per-phase frame profiler
+# A frame is split into phases by calling lap(name) at the end of each phase, the time since the
+# previous lap is booked on that phase. Rolling percentiles can be drawn as an overlay and the
+# recorded frames exported as a Chrome trace (chrome://tracing, ui.perfetto.dev).
+import json
+import time
+from collections import deque
+
+class FrameProfiler():
+	def __init__(self, window:int=600, trace_frames:int=0):
+		self._window = window		# frames the rolling statistics cover
+		self._samples = dict()		# phase -> deque of per-frame times (ns)
+		self._frames = deque(maxlen=window)	# whole frame times (ns)
+		self._current = dict()
+		# Chrome trace events of the last trace_frames frames (0: no tracing)
+		self._trace = deque(maxlen=trace_frames*16) if trace_frames else None
+		self._origin = time.perf_counter_ns()
+		self._frame_start = self._last = self._origin	# laps before the first begin_frame count from here
+
+	def begin_frame(self) -> None:
+		self._frame_start = self._last = time.perf_counter_ns()
+		self._current.clear()
+
+	# Book the time since the previous lap on a phase (phases can be hit several times per frame)
+	def lap(self, phase:str) -> None:
+		now = time.perf_counter_ns()
+		self._current[phase] = self._current.get(phase, 0)+now-self._last
+		if self._trace is not None:
+			self._trace.append({"name": phase, "ph": "X", "pid": 0, "tid": 0, "ts": (self._last-self._origin)/1000, "dur": (now-self._last)/1000})
+		self._last = now
+
+	def end_frame(self) -> None:
+		self._frames.append(self._last-self._frame_start)
+		for phase, duration in self._current.items():
+			samples = self._samples.get(phase)
+			if samples is None:
+				samples = self._samples[phase] = deque(maxlen=self._window)
+			samples.append(duration)
+
+	# Rolling p50/p95/p99 (milliseconds) per phase and for the whole frame
+	def stats(self) -> dict:
+		def percentiles(samples) -> dict:
+			ordered = sorted(samples)
+			pick = lambda p: ordered[min(len(ordered)-1, int(p/100*len(ordered)))]/1e6
+			return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+		stats = {phase: percentiles(samples) for phase, samples in self._samples.items() if samples}
+		if self._frames:
+			stats["frame"] = percentiles(self._frames)
+		return stats
+
+	# Text lines for the on-screen overlay
+	def report(self) -> list:
+		lines = [f"{'phase':<14}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+		for phase, values in self.stats().items():
+			lines.append(f"{phase:<14}{values['p50']:>8.2f}{values['p95']:>8.2f}{values['p99']:>8.2f}")
+		return lines
+
+	# Write the recorded frames as a Chrome trace JSON file
+	def dump_trace(self, path:str) -> None:
+		with open(path, "w") as file:
+			json.dump({"traceEvents": list(self._trace or ()), "displayTimeUnit": "ms", "otherData": {"stats": self.stats()}}, file)
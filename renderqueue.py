@@ -0,0 +1,58 @@
+# Layered render queue
+# Draw commands (sprite, position, layer) are collected while a frame is built and submitted with one
+# Surface.blits() call per layer, lower layers first and the commands of a layer in the order they
+# were added. Debug outlines (e.g. hitboxes) are collected separately and drawn above every layer.
+import pygame
+
+class RenderQueue():
+	def __init__(self):
+		self._layers = dict()	# layer -> list of (surface, position), the lists are reused every frame
+		self._order = list()	# layers in drawing order
+		self._rects = list()	# (color, rect, width) outlines
+
+	def _commands(self, layer:int) -> list:
+		commands = self._layers.get(layer)
+		if commands is None:
+			commands = self._layers[layer] = list()
+			self._order = sorted(self._layers)
+		return commands
+
+	def add(self, surface:pygame.Surface, position, layer:int=0) -> None:
+		self._commands(layer).append((surface, position))
+
+	# Add many (surface, position) pairs to one layer
+	def extend(self, commands, layer:int=0) -> None:
+		self._commands(layer).extend(commands)
+
+	# Outline a rect above all sprites (drawn with pygame.draw.rect)
+	def rect(self, rect, color:tuple, width:int=1) -> None:
+		self._rects.append((color, rect, width))
+
+	def __len__(self) -> int:
+		return sum(map(len, self._layers.values()))+len(self._rects)
+
+	# Draw every queued command and empty the queue, returns the changed areas (if doreturn)
+	# surface: a pygame.Surface or anything with a Surface.blits-like method (e.g. gpu.TextureDisplay)
+	def submit(self, surface:pygame.Surface, doreturn:bool=True) -> list:
+		dirty = list()
+		for layer in self._order:
+			commands = self._layers[layer]
+			if not commands:
+				continue
+			if doreturn:
+				dirty.extend(surface.blits(commands))
+			else:
+				surface.blits(commands, doreturn=False)
+			commands.clear()
+		for color, rect, width in self._rects:
+			area = pygame.draw.rect(surface, color, rect, width)
+			if doreturn:
+				dirty.append(area)
+		self._rects.clear()
+		return dirty
+
+	# Drop every queued command without drawing it
+	def clear(self) -> None:
+		for commands in self._layers.values():
+			commands.clear()
+		self._rects.clear()
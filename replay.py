@@ -0,0 +1,74 @@
+# Input recording and replay
+# A replay is the RNG seed, tick rate, spawn schedule file and simulation switches of a round plus
+# the key state of every simulation tick, run-length encoded (players hold keys for many ticks). Feeding the keys back into
+# a Game built from the same seed replays the round exactly, headless or rendered.
+import collections
+import hashlib
+import json
+import struct
+import pygame
+
+MAGIC = b"MURIRPLY"
+VERSION = 1
+_HEADER = struct.Struct("<8sII")	# magic, version, length of the JSON header
+_RUN = struct.Struct("<BI")			# key mask, ticks it was held for
+
+# Recorded keys, bit i of a mask is KEYS[i]
+KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_f, pygame.K_ESCAPE)
+# Key state of every mask (indexable by pygame key constants like pygame.key.get_pressed())
+STATES = [collections.defaultdict(bool, {key: bool(mask >> bit & 1) for bit, key in enumerate(KEYS)}) for mask in range(1 << len(KEYS))]
+
+def mask(keys) -> int:
+	return sum(1 << bit for bit, key in enumerate(KEYS) if keys[key])
+
+# Fingerprint of a Game.state(), a replay ending in another state diverged from the recording
+def digest(state:dict) -> str:
+	return hashlib.md5(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+class Replay():
+	def __init__(self, seed:int, tps:int, masks:list=None, state:str=None, waves:str=None, switches:dict=None):
+		self.seed = seed
+		self.tps = tps
+		self.waves = waves	# spawn schedule file (None: the classic spawns)
+		self.switches = switches if switches is not None else dict()	# simulation switches (see main.simulation_switches), missing ones are the defaults
+		self.masks = masks if masks is not None else list()	# key mask per tick
+		self.state = state	# digest of the final game state (None if unknown)
+
+	def __len__(self) -> int:
+		return len(self.masks)
+
+	# Remember the keys of the next tick
+	def record(self, keys) -> None:
+		self.masks.append(mask(keys))
+
+	# Keys of a tick (for main.simulate's inputs)
+	def inputs(self, tick:int):
+		return STATES[self.masks[tick]]
+
+	def save(self, path:str) -> None:
+		runs = list()
+		for value in self.masks:
+			if runs and runs[-1][0] == value:
+				runs[-1][1] += 1
+			else:
+				runs.append([value, 1])
+		header = json.dumps({"seed": self.seed, "tps": self.tps, "waves": self.waves, "switches": self.switches, "ticks": len(self.masks), "state": self.state}).encode()
+		with open(path, "wb") as file:
+			file.write(_HEADER.pack(MAGIC, VERSION, len(header)))
+			file.write(header)
+			file.write(b"".join(_RUN.pack(value, count) for value, count in runs))
+
+	@classmethod
+	def load(cls, path:str) -> "Replay":
+		with open(path, "rb") as file:
+			data = file.read()
+		magic, version, length = _HEADER.unpack_from(data)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a murimuri replay (version {VERSION})")
+		header = json.loads(data[_HEADER.size:_HEADER.size+length])
+		masks = list()
+		for value, count in _RUN.iter_unpack(data[_HEADER.size+length:]):
+			masks.extend([value]*count)
+		if len(masks) != header["ticks"]:
+			raise ValueError(f"{path} is truncated ({len(masks)} of {header['ticks']} ticks)")
+		return cls(header["seed"], header["tps"], masks, header["state"], header.get("waves"), header.get("switches"))
@@ -0,0 +1,132 @@
+# Process-wide asset registry
+# Every image/sound is decoded once and shared between all entities.
+import io
+import pygame
+from collections import namedtuple
+
+# Handle of a cached image: path, target size (or None) and whether it keeps its alpha channel
+ImageKey = namedtuple("ImageKey", ("path", "size", "alpha"), defaults=(None, True))
+
+_images = dict()
+_sounds = dict()
+_music = dict()		# path -> encoded file contents
+_variants = dict()
+_masks = dict()
+_scaled = dict()
+_sheets = list()	# [sheet surface, alpha, converted, {ImageKey: rect}] of loaded atlases
+
+# Build a registry handle for an image
+def handle(path:str, size:tuple=None, alpha:bool=True) -> ImageKey:
+	return ImageKey(path, tuple(size) if size else None, alpha)
+
+# Convert a surface to the display format (only possible once a window exists)
+def _to_display_format(surface:pygame.Surface, alpha:bool) -> tuple[pygame.Surface, bool]:
+	if not pygame.display.get_init() or pygame.display.get_surface() is None:
+		return surface, False
+	return (surface.convert_alpha() if alpha else surface.convert()), True
+
+# Get a decoded, pre-scaled image (display format as soon as a window exists)
+def image(path, size:tuple=None, alpha:bool=True) -> pygame.Surface:
+	key = path if isinstance(path, ImageKey) else handle(path, size, alpha)
+	cached = _images.get(key)
+	if cached is not None and cached[1]:
+		return cached[0]
+	if cached is not None and _convert_sheets() and _images[key][1]:
+		return _images[key][0]
+	if cached is None:
+		surface = _decode(key)
+	else:
+		surface = cached[0]
+	_images[key] = _to_display_format(surface, key.alpha)
+	return _images[key][0]
+
+def _decode(key:ImageKey) -> pygame.Surface:
+	surface = pygame.image.load(key.path)
+	if key.size:
+		surface = pygame.transform.scale(surface, key.size)
+	return surface
+
+# Decode an image without converting it (safe to call from a loader thread), image() converts it later
+def preload(key:ImageKey) -> None:
+	if key not in _images:
+		_images.setdefault(key, (_decode(key), False))
+
+# Register the images of an atlas sheet, they are cached as subsurfaces of the sheet
+def add_sheet(surface:pygame.Surface, regions:dict, alpha:bool=True) -> None:
+	_sheets.append([surface, alpha, False, dict(regions)])
+	for key, rect in regions.items():
+		_images[key] = (surface.subsurface(rect), False)
+	_convert_sheets()
+
+# Convert the sheets that were loaded before the window was created (as a whole, so their images
+# stay subsurfaces of one sheet), returns whether all sheets are in display format
+def _convert_sheets() -> bool:
+	for sheet in _sheets:
+		if sheet[2]:
+			continue
+		surface, converted = _to_display_format(sheet[0], sheet[1])
+		if not converted:
+			return False
+		sheet[0], sheet[2] = surface, True
+		for key, rect in sheet[3].items():
+			_images[key] = (surface.subsurface(rect), True)
+	return True
+
+# Get a decoded sound, sharing the instance between all users
+def sound(path:str, volume:float=None) -> pygame.mixer.Sound:
+	cached = _sounds.get(path)
+	if cached is None:
+		cached = _sounds[path] = pygame.mixer.Sound(path)
+	if volume is not None:
+		cached.set_volume(volume)
+	return cached
+
+# In-memory file of a music track for pygame.mixer.music.load, read from disk once
+def music(path:str) -> io.BytesIO:
+	data = _music.get(path)
+	if data is None:
+		with open(path, "rb") as file:
+			data = _music[path] = file.read()
+	return io.BytesIO(data)
+
+# Copy of a surface multiplied by a RGBA color (BLEND_RGBA_MULT), computed once per surface and color
+def tint(surface:pygame.Surface, color:tuple) -> pygame.Surface:
+	key = (surface, color)
+	cached = _variants.get(key)
+	if cached is None:
+		overlay = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+		overlay.fill(color)
+		cached = _variants[key] = surface.copy()
+		cached.blit(overlay, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+	return cached
+
+# Smoothly scaled copy of a surface, computed once per surface and size
+def scaled(surface:pygame.Surface, size:tuple) -> pygame.Surface:
+	key = (surface, size)
+	cached = _scaled.get(key)
+	if cached is None:
+		cached = _scaled[key] = pygame.transform.smoothscale(surface, size)
+	return cached
+
+# Collision mask of the opaque pixels of a surface, computed once per surface
+def mask(surface:pygame.Surface) -> pygame.mask.Mask:
+	cached = _masks.get(surface)
+	if cached is None:
+		cached = _masks[surface] = pygame.mask.from_surface(surface)
+	return cached
+
+# Convert all images that were loaded before the window was created
+def convert_all() -> None:
+	_convert_sheets()
+	for key in list(_images):
+		image(key)
+
+# Drop every cached asset (e.g. after the display was re-created)
+def clear() -> None:
+	_images.clear()
+	_sheets.clear()
+	_sounds.clear()
+	_music.clear()
+	_variants.clear()
+	_masks.clear()
+	_scaled.clear()
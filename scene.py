@@ -0,0 +1,62 @@
+# Scenes and the scene manager
+# The window, the clock and every loaded asset belong to the manager and survive scene changes,
+# a scene only draws frames and decides which scene comes next.
+import pygame
+
+class Scene():
+	def __init__(self, manager):
+		self.manager = manager
+
+	# Called every time the scene becomes the active one
+	def enter(self) -> None:
+		pass
+
+	# Called when another scene takes over (or the game quits)
+	def exit(self) -> None:
+		pass
+
+	# Run one frame with this frame's events, returns the next scene (self to stay, None to quit)
+	def frame(self, events:list):
+		return self
+
+class SceneManager():
+	# display: gpu.TextureDisplay the screen surface is shown on (None: pygame.display)
+	def __init__(self, screen:pygame.Surface, clock=None, display=None):
+		self.screen = screen
+		self.clock = clock or pygame.time.Clock()
+		self.display = display
+		self.scenes = dict()	# name -> scene, every scene is built once and reused
+		self.scene = None
+
+	def add(self, name:str, scene:Scene) -> Scene:
+		self.scenes[name] = scene
+		return scene
+
+	# Switch to another scene (by name or instance)
+	def switch(self, scene) -> None:
+		if isinstance(scene, str):
+			scene = self.scenes[scene]
+		if self.scene is not None:
+			self.scene.exit()
+		self.scene = scene
+		if scene is not None:
+			scene.enter()
+
+	# Show what a scene drew into the screen surface
+	def present(self) -> None:
+		if self.display is not None:
+			self.display.show()
+		else:
+			pygame.display.update()
+
+	# Run scenes until one returns None or the window is closed
+	def run(self, scene) -> None:
+		self.switch(scene)
+		while self.scene is not None:
+			events = pygame.event.get()
+			if any(event.type == pygame.QUIT for event in events):
+				self.switch(None)
+				break
+			following = self.scene.frame(events)
+			if following is not self.scene:
+				self.switch(following)
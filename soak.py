@@ -0,0 +1,236 @@
+# Soak test: play the game headless for hours of simulated time and report what drifts
+# A bot (random key presses or a recorded round on repeat) plays long rounds with the real spawn
+# cycles: the player is invulnerable by default and a round restarts in place (like the game-over
+# screen does) every ROUND_MINUTES, so the late spawn cycles and big waves are reached.
+# Every interval the traced memory, live objects by type and frame time percentiles are sampled,
+# the report flags every value whose trend keeps growing after the warmup, e.g.
+#   python soak.py --hours 8 --output soak.json
+#   python soak.py --hours 1 --render --script session.rpl
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import benchmark
+import main
+import replay
+import resources
+
+INTERVAL = 60		# simulated seconds between samples
+WARMUP = 5			# simulated minutes before the baseline (caches and pools fill up first)
+ROUND_MINUTES = 30	# simulated minutes a round lasts before it restarts (unless the player dies first)
+MASKS = 1 << 5		# W, A, S, D and F pressed or not (ESC would end a kiosk session)
+# Objects counted in every sample
+WATCHED = {"Entity": main.Entity, "Surface": pygame.Surface, "Rect": pygame.Rect}
+# Flagged growth of a series over the measured run: share of its baseline and an absolute floor
+# (small absolute changes are noise)
+TOLERANCE = {
+	"traced_mb": (0.10, 1.0),
+	"gc_objects": (0.10, 500),
+	"objects": (0.10, 50),
+	"caches": (0.10, 10),
+	"entities": (0.50, 20),
+	"frame_ms": (0.25, 0.05),
+}
+# Series kept in the report but not checked for growth (a single slowest frame is too noisy for a trend)
+UNCHECKED = ("frame_ms.max",)
+
+# Random key presses held for 0.1-1 s, like someone mashing keys at a kiosk
+class RandomInput():
+	def __init__(self, rng, tps:int):
+		self._rng = rng
+		self._tps = tps
+		self._keys = main.NO_INPUT
+		self._left = 0	# ticks the current keys are still held
+
+	def __call__(self, tick:int):
+		if self._left <= 0:
+			self._keys = replay.STATES[self._rng.randrange(MASKS)]
+			self._left = self._rng.randint(self._tps//10, self._tps)
+		self._left -= 1
+		return self._keys
+
+# Live objects of the watched types, pygame objects are not tracked by the garbage collector and
+# are found as referents of the objects that are (and of the untracked tuples and dicts in between)
+def count_objects(types:dict=WATCHED) -> dict:
+	gc.collect()
+	kinds = tuple(types.values())
+	found, searched = dict(), set()
+	pending = gc.get_objects()
+	while pending:
+		holder = pending.pop()
+		if isinstance(holder, kinds):
+			found[id(holder)] = holder
+		for item in gc.get_referents(holder):
+			if isinstance(item, kinds):
+				found[id(item)] = item
+			elif isinstance(item, (tuple, dict)) and not gc.is_tracked(item) and id(item) not in searched:
+				searched.add(id(item))
+				pending.append(item)
+	counts = {name: sum(isinstance(item, kind) for item in found.values()) for name, kind in types.items()}
+	found.clear()
+	return counts
+
+# Entries of the resource caches (sprites, tints, masks and scaled copies)
+def cache_entries() -> int:
+	return sum(map(len, (resources._images, resources._variants, resources._masks, resources._scaled)))
+
+# Least-squares slope of values over times
+def slope(times:list, values:list) -> float:
+	mean_time, mean_value = sum(times)/len(times), sum(values)/len(values)
+	spread = sum((time-mean_time)**2 for time in times)
+	return sum((time-mean_time)*(value-mean_value) for time, value in zip(times, values))/spread if spread else 0.0
+
+# Flat name -> value view of a sample (nested groups become "group.name")
+def flatten(sample:dict) -> dict:
+	values = dict()
+	for name in TOLERANCE:
+		value = sample[name]
+		if isinstance(value, dict):
+			values.update({f"{name}.{key}": item for key, item in value.items()})
+		else:
+			values[name] = value
+	return values
+
+# Growth of every series over the samples after the warmup, flagged when its fitted trend exceeds the tolerance
+def analyze(samples:list, warmup:float) -> dict:
+	measured = [sample for sample in samples if sample["time_s"] >= warmup]
+	if len(measured) < 3:
+		return dict()
+	times = [sample["time_s"]/3600 for sample in measured]
+	series = [flatten(sample) for sample in measured]
+	growth = dict()
+	for name in series[0]:
+		values = [values[name] for values in series]
+		trend = slope(times, values)
+		added = trend*(times[-1]-times[0])	# fitted growth over the measured run
+		share, floor = TOLERANCE[name.split(".")[0]]
+		growth[name] = {
+			"baseline": values[0],
+			"last": values[-1],
+			"per_hour": trend,
+			"growing": name not in UNCHECKED and added > max(share*abs(values[0]), floor),
+		}
+	return growth
+
+# hours: simulated time, script: replay.Replay whose keys every round plays again (None: random keys)
+# render: draw every tick with the game's renderer (on SDL's dummy video driver)
+# invulnerable: hits are detected but cost no health, round_minutes: restart a round after this long
+# (None: only when the player dies)
+def soak(hours:float, seed:int=0, script:replay.Replay=None, render:bool=False, store:bool=False, interval:float=INTERVAL, warmup:float=WARMUP, waves:str=None, frames:int=1, invulnerable:bool=True, round_minutes:float=ROUND_MINUTES, log=print) -> dict:
+	main.headless()
+	renderer = None
+	tracemalloc.start(frames)
+	seeds = random.Random(seed)
+	if script is not None:
+		inputs = lambda tick: script.inputs(tick%len(script))
+	else:
+		inputs = RandomInput(random.Random(seeds.getrandbits(32)), main.TPS)
+	game = main.Game(clock=main.TickClock(main.TPS), rng=random.Random(seeds.getrandbits(32)), store=store, tps=main.TPS, schedule=main.load_schedule(waves))
+	if invulnerable:
+		# like benchmark.make_collide_game, every collision check still runs
+		game.player.hit = lambda: None
+	if render:
+		renderer = main.make_renderer(pygame.display.set_mode((main.WIDTH, main.HEIGHT)), resources.image(main.BACKGROUND_IMAGE))
+
+	total = round(hours*3600*main.TPS)
+	round_ticks = round(round_minutes*60*main.TPS) if round_minutes else None
+	per_sample = max(1, round(interval*main.TPS))
+	samples, timings = list(), list()
+	baseline = None	# tracemalloc snapshot at the end of the warmup
+	rounds, ticks = 1, 0
+	started = time.perf_counter()
+	while ticks < total:
+		if game.over or (round_ticks and game.ticks >= round_ticks):
+			# retry in place with a fresh clock and seed, like the game-over screen
+			game.reset(clock=main.TickClock(main.TPS), rng=random.Random(seeds.getrandbits(32)))
+			rounds += 1
+		start = time.perf_counter_ns()
+		game.update(inputs(game.ticks))
+		game.clock.tick(main.TPS)
+		if renderer:
+			renderer.draw(game)
+			renderer.present()
+		timings.append(time.perf_counter_ns()-start)
+		ticks += 1
+		if ticks%per_sample and ticks != total:
+			continue
+
+		timings.sort()
+		sample = {
+			"time_s": ticks/main.TPS,
+			"wall_s": time.perf_counter()-started,
+			"rounds": rounds,
+			"entities": len(game.entities),
+			"traced_mb": tracemalloc.get_traced_memory()[0]/2**20,
+			"gc_objects": len(gc.get_objects()),
+			"objects": count_objects(),
+			"caches": cache_entries(),
+			"frame_ms": {name: benchmark.percentile(timings, p)/1e6 for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+		}
+		samples.append(sample)
+		timings.clear()
+		log(f"{sample['time_s']/60:8.1f} min  round {rounds:5}  entities {sample['entities']:4}  traced {sample['traced_mb']:7.2f} MB  "
+			f"surfaces {sample['objects']['Surface']:6}  rects {sample['objects']['Rect']:6}  p95 {sample['frame_ms']['p95']:6.3f} ms")
+		if baseline is None and sample["time_s"] >= warmup*60:
+			baseline = tracemalloc.take_snapshot()
+
+	# allocations that grew the most since the warmup (by source line)
+	top = list()
+	if baseline is not None:
+		ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+		final = tracemalloc.take_snapshot().filter_traces(ignored)
+		top = [str(stat) for stat in final.compare_to(baseline.filter_traces(ignored), "lineno")[:10]]
+	tracemalloc.stop()
+	growth = analyze(samples, warmup*60)
+	return {
+		"commit": benchmark.git_commit(),
+		"python": sys.version.split()[0],
+		"pygame": pygame.version.ver,
+		"hours": hours,
+		"seed": seed,
+		"input": "script" if script is not None else "random",
+		"invulnerable": invulnerable,
+		"round_minutes": round_minutes,
+		"render": render,
+		"store": store,
+		"rounds": rounds,
+		"wall_s": time.perf_counter()-started,
+		"samples": samples,
+		"growth": growth,
+		"growing": sorted(name for name, values in growth.items() if values["growing"]),
+		"top_allocations": top,
+	}
+
+if __name__=="__main__":
+	parser = argparse.ArgumentParser(description="murimuri soak test")
+	parser.add_argument("--hours", type=float, default=1.0, help="simulated hours to play")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the rounds and the random keys")
+	parser.add_argument("--script", metavar="FILE", help="recorded round (main.py --record) whose keys every round plays instead of random keys")
+	parser.add_argument("--render", action="store_true", help="draw every tick with the game's renderer")
+	parser.add_argument("--store", action="store_true", help="move entities with the vectorized numpy entity store")
+	parser.add_argument("--mortal", action="store_true", help="let the player take damage, rounds end when it dies")
+	parser.add_argument("--round-minutes", type=float, default=ROUND_MINUTES, help="simulated minutes before a round restarts (0: only when the player dies)")
+	parser.add_argument("--waves", metavar="FILE", help="spawn schedule file (default: the classic spawns)")
+	parser.add_argument("--interval", type=float, default=INTERVAL, help="simulated seconds between samples")
+	parser.add_argument("--warmup", type=float, default=WARMUP, help="simulated minutes before the baseline")
+	parser.add_argument("--frames", type=int, default=1, help="stack frames tracemalloc keeps per allocation")
+	parser.add_argument("--output", default="soak.json", help="JSON file to write the report to")
+	args = parser.parse_args()
+	report = soak(args.hours, args.seed, replay.Replay.load(args.script) if args.script else None, args.render, args.store, args.interval, args.warmup, args.waves, args.frames, not args.mortal, args.round_minutes)
+	with open(args.output, "w") as file:
+		json.dump(report, file, indent=2)
+	for name in report["growing"]:
+		values = report["growth"][name]
+		print(f"GROWING {name}: {values['baseline']:.3f} -> {values['last']:.3f} ({values['per_hour']:+.3f}/h)")
+	print(f"{report['rounds']} rounds, report written to {args.output}")
+	# a failing exit code lets scripts and CI catch regressions
+	sys.exit(1 if report["growing"] else 0)
@@ -0,0 +1,123 @@
+# Data-driven spawn scheduling
+# Pending spawns wait in a heap ordered by their time, a tick only pops the spawns that are due.
+# A schedule combines fixed waves with the endless spawn cycles of the classic game.
+import heapq
+import json
+from collections import namedtuple
+
+# A group of entities entering together
+# time: ms after the game started, kind: "ball", "alien" or "cactus", lane: 1-4 (aliens and cacti,
+# None: random), velocity: pixels per tick at main.TUNED_TPS (None: the kind's default),
+# every: repeat interval in ms (None: once), times: number of spawns when repeating (None: endless)
+Wave = namedtuple("Wave", ("time", "kind", "count", "lane", "velocity", "every", "times"), defaults=(1, None, None, None, None))
+
+# Endless spawns of one entity with a growing gap: cycle n spawns interval*n ms after cycle n-1,
+# its kind is the one of the first (divisor, kind) rule dividing n, or default
+Cycles = namedtuple("Cycles", ("interval", "rules", "default"))
+
+Schedule = namedtuple("Schedule", ("waves", "cycles"), defaults=((), None))
+
+KINDS = ("ball", "alien", "cactus")	# kinds a schedule can spawn
+LANES = (1, 2, 3, 4)	# lanes of aliens and cacti, from the top
+
+# JSON number check (bools are ints in Python, but not numbers in a wave file)
+def _number(value, kinds=(int, float)) -> bool:
+	return isinstance(value, kinds) and not isinstance(value, bool)
+
+# Reject a kind the game can't spawn
+def _check_kind(path:str, kind:str, where:str) -> None:
+	if kind not in KINDS:
+		raise ValueError(f"{path}: {where} spawns unknown kind {kind!r}, kinds are {', '.join(KINDS)}")
+
+# Read a schedule from a JSON file, e.g.
+# {"cycles": {"interval": 5000, "rules": [[2, "cactus"], [5, "ball"]], "default": "alien"},
+#  "waves": [{"time": 60000, "kind": "alien", "count": 200, "lane": 2, "every": 10000}]}
+# raises ValueError for waves and cycles the scheduler can't play
+def load(path:str) -> Schedule:
+	with open(path) as file:
+		data = json.load(file)
+	cycles = data.get("cycles")
+	if cycles is not None:
+		try:
+			cycles = Cycles(cycles["interval"], tuple(tuple(rule) for rule in cycles.get("rules", ())), cycles["default"])
+		except KeyError as error:
+			raise ValueError(f"{path}: the cycles have no {error}") from None
+		except (TypeError, AttributeError) as error:
+			raise ValueError(f"{path}: the cycles are malformed ({error})") from None
+		if not _number(cycles.interval) or cycles.interval <= 0:
+			raise ValueError(f"{path}: the cycle interval must be a positive number (not {cycles.interval!r})")
+		for rule in cycles.rules:
+			if len(rule) != 2:
+				raise ValueError(f"{path}: the cycle rules are [divisor, kind] pairs (not {list(rule)!r})")
+			divisor, kind = rule
+			if not _number(divisor, int) or divisor <= 0:
+				raise ValueError(f"{path}: the cycle rule divisors must be positive integers (not {divisor!r})")
+			_check_kind(path, kind, "a cycle rule")
+		_check_kind(path, cycles.default, "the cycles")
+	waves = list()
+	for number, wave in enumerate(data.get("waves", ()), 1):
+		try:
+			wave = Wave(**wave)
+		except TypeError as error:
+			# unknown or missing fields (e.g. "lanes" instead of "lane") or no object at all
+			raise ValueError(f"{path}: wave {number} is malformed ({error})") from None
+		waves.append(wave)
+		_check_kind(path, wave.kind, f"wave {number}")
+		for field in ("time", "count", "lane", "velocity", "every", "times"):
+			value = getattr(wave, field)
+			if value is not None and not _number(value, int if field in ("count", "lane", "times") else (int, float)):
+				raise ValueError(f"{path}: wave {number} has an invalid {field} ({value!r})")
+		if wave.time < 0:
+			raise ValueError(f"{path}: wave {number} starts before the game (time {wave.time})")
+		if wave.count < 0:
+			raise ValueError(f"{path}: wave {number} has a negative count ({wave.count})")
+		if wave.lane is not None and wave.lane not in LANES:
+			raise ValueError(f"{path}: wave {number} is in lane {wave.lane}, lanes are {LANES[0]}-{LANES[-1]}")
+		if wave.every is not None and wave.every < 0:
+			raise ValueError(f"{path}: wave {number} repeats every {wave.every} ms, the interval can't be negative")
+		if wave.times is not None and wave.times < 1:
+			raise ValueError(f"{path}: wave {number} spawns {wave.times} times, at least once is needed")
+	return Schedule(tuple(waves), cycles)
+
+class SpawnScheduler():
+	def __init__(self, schedule:Schedule):
+		self.schedule = schedule
+		self.cycles = 1		# number of the next spawn cycle
+		self._queue = list()	# heap of (time, order, wave, spawns left)
+		self._order = 0		# insertion counter, keeps spawns due at the same time in order
+
+	def _push(self, time:int, wave:Wave, left) -> None:
+		heapq.heappush(self._queue, (time, self._order, wave, left))
+		self._order += 1
+
+	# Schedule every wave again for a game started at `start` (clock ms)
+	def reset(self, start:int) -> None:
+		self._queue.clear()
+		self.cycles = 1
+		for wave in self.schedule.waves:
+			self._push(start+wave.time, wave, wave.times)
+		if self.schedule.cycles:
+			self._push(start+self.schedule.cycles.interval, None, None)
+
+	# Time of the next spawn (None if nothing is left)
+	def next_time(self):
+		return self._queue[0][0] if self._queue else None
+
+	# Pop the waves that are due at `now`
+	def due(self, now:int) -> list:
+		queue = self._queue
+		waves = list()
+		while queue and queue[0][0] <= now:
+			time, _, wave, left = heapq.heappop(queue)
+			if wave is None:
+				# the next cycle counts from this spawn, like the classic game
+				cycles = self.schedule.cycles
+				kind = next((kind for divisor, kind in cycles.rules if self.cycles%divisor == 0), cycles.default)
+				waves.append(Wave(time, kind))
+				self.cycles += 1
+				self._push(now+cycles.interval*self.cycles, None, None)
+				continue
+			waves.append(wave)
+			if wave.every and (left is None or left > 1):
+				self._push(time+wave.every, wave, None if left is None else left-1)
+		return waves